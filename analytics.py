@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+FocusTimer 统计分析引擎（不依赖 Tk）
+================================================================================
+直接在 SessionStore 的 array 列（开始 epoch / 时长 / 任务 id）上计算：
+按任务合计、按小时(开始时刻)与按星期分布、会话时长直方图。
+另有连续天数 / 目标进度 / 近 7、30 天日均与稳定度，随每条新会话增量维护。
+装了 NumPy 时整列向量化计算（零拷贝读取 array 缓冲区），否则退回纯 Python 循环，结果一致。
+NumPy 在第一次 breakdown 时才导入：只用增量统计的场合（命令行）不必付出约 100 ms 的导入代价。
+"""
+from __future__ import annotations
+from datetime import date, datetime, timedelta
+
+np = None
+_np_tried = False
+
+def _numpy():
+    global np, _np_tried
+    if not _np_tried:
+        _np_tried = True
+        try:
+            import numpy
+            np = numpy
+        except Exception:
+            np = None
+    return np
+
+# 会话时长直方图分桶（分钟，左闭右开，最后一桶不封顶）
+LENGTH_EDGES_MIN = (0, 5, 10, 15, 25, 30, 45, 60, 90, 120)
+WEEKDAY_NAMES = ("一", "二", "三", "四", "五", "六", "日")
+
+
+def length_labels():
+    e = LENGTH_EDGES_MIN
+    return [f"{e[i]}-{e[i+1]}分" for i in range(len(e) - 1)] + [f"{e[-1]}分以上"]
+
+
+def _utc_offsets(lo, hi):
+    """[lo, hi] 覆盖的每个 UTC 日 -> 当天本地时区偏移(秒)；返回 (首日序号, 偏移列表)。
+    夏令时只在日内切换一次，按日取样足够；5 年也只有不到 2000 次系统调用。"""
+    d0, d1 = lo // 86400 - 1, hi // 86400 + 1
+    offs = []
+    for d in range(d0, d1 + 1):
+        off = datetime.fromtimestamp(d * 86400 + 43200).astimezone().utcoffset()
+        offs.append(int(off.total_seconds()) if off else 0)
+    return d0, offs
+
+
+def breakdown(store, lo=None, hi=None):
+    """统计结束时间落在 [lo, hi)（epoch 秒，None 为不限）内的会话。
+
+    返回 dict：count、total、tasks {任务: 秒}、hours/hour_counts（24 项，按开始小时）、
+    weekdays（7 项，周一在前，按开始日期）、lengths（各时长桶的会话数）。"""
+    if _numpy() is not None:
+        return _breakdown_numpy(store, lo, hi)
+    return _breakdown_array(store, lo, hi)
+
+
+def _empty():
+    return {"count": 0, "total": 0, "tasks": {}, "hours": [0] * 24, "hour_counts": [0] * 24,
+            "weekdays": [0] * 7, "lengths": [0] * len(LENGTH_EDGES_MIN), "engine": "numpy"}
+
+
+def _breakdown_numpy(store, lo, hi):
+    if not len(store): return _empty()
+    st = np.frombuffer(store.start, dtype=np.int64)
+    sec = np.frombuffer(store.seconds, dtype=np.int32).astype(np.int64)
+    tid = np.frombuffer(store.task_id, dtype=np.uint32)
+    end = st + sec
+    mask = np.ones(len(st), dtype=bool)
+    if lo is not None: mask &= end >= lo
+    if hi is not None: mask &= end < hi
+    st, sec, tid = st[mask], sec[mask], tid[mask]
+    if not len(st): return _empty()
+    d0, offs = _utc_offsets(int(st.min()), int(st.max()))
+    local = st + np.asarray(offs, dtype=np.int64)[st // 86400 - d0]
+    hour = (local % 86400) // 3600
+    wday = (local // 86400 + 3) % 7          # 1970-01-01 是周四
+    per_task = np.bincount(tid, weights=sec, minlength=len(store.task_names))
+    edges = np.asarray(LENGTH_EDGES_MIN, dtype=np.int64) * 60
+    bucket = np.searchsorted(edges, sec, side="right") - 1
+    return {
+        "count": int(len(st)), "total": int(sec.sum()),
+        "tasks": {store.task_names[i]: int(v) for i, v in enumerate(per_task) if v},
+        "hours": [int(v) for v in np.bincount(hour, weights=sec, minlength=24)],
+        "hour_counts": [int(v) for v in np.bincount(hour, minlength=24)],
+        "weekdays": [int(v) for v in np.bincount(wday, weights=sec, minlength=7)],
+        "lengths": [int(v) for v in np.bincount(np.clip(bucket, 0, None), minlength=len(edges))],
+        "engine": "numpy",
+    }
+
+
+def _breakdown_array(store, lo, hi):
+    out = _empty(); out["engine"] = "array"
+    if not len(store): return out
+    lo = -2**62 if lo is None else lo; hi = 2**62 if hi is None else hi
+    d0, offs = _utc_offsets(min(store.start), max(store.start))
+    edges = [e * 60 for e in LENGTH_EDGES_MIN]
+    per_task = [0] * len(store.task_names)
+    hours, hour_counts, weekdays, lengths = out["hours"], out["hour_counts"], out["weekdays"], out["lengths"]
+    count = total = 0
+    for st, n, t in zip(store.start, store.seconds, store.task_id):
+        if not (lo <= st + n < hi): continue
+        local = st + offs[st // 86400 - d0]
+        h = (local % 86400) // 3600
+        hours[h] += n; hour_counts[h] += 1
+        weekdays[(local // 86400 + 3) % 7] += n
+        b = len(edges) - 1
+        while b > 0 and n < edges[b]: b -= 1
+        lengths[b] += 1
+        per_task[t] += n; count += 1; total += n
+    out.update(count=count, total=total,
+               tasks={store.task_names[i]: v for i, v in enumerate(per_task) if v})
+    return out
+
+
+# --------- 连续天数 / 目标进度 / 稳定度（增量维护） ---------
+# streaks: {"*": 总体, 任务名: 该任务} -> {"last": 最后专注日 ISO, "cur": 截至 last 的连续天数, "best": 最长}
+# 每条新会话只改两项（总体 + 所属任务），O(1)；日均与稳定度直接查按天汇总（rollups），代价只与窗口天数有关。
+ALL = "*"
+
+
+def bump_streak(streaks, key, day):
+    """把 day（YYYY-MM-DD）记为 key 的专注日。day 早于已记录的最后一天（导入的旧记录）时返回 False，
+    调用方应改用 rebuild_streaks 整体重算。"""
+    st = streaks.get(key)
+    if st is None:
+        streaks[key] = {"last": day, "cur": 1, "best": 1}; return True
+    last = st["last"]
+    if day == last: return True
+    if day < last: return False
+    gap = (date.fromisoformat(day) - date.fromisoformat(last)).days
+    st["cur"] = st["cur"] + 1 if gap == 1 else 1
+    st["last"] = day; st["best"] = max(st["best"], st["cur"])
+    return True
+
+
+def rebuild_streaks(rollups):
+    """从按天汇总整体重算全部 streaks（O(天数 × 每天任务数)）。"""
+    streaks = {}
+    for day in sorted(rollups):
+        r = rollups[day]
+        if not r.get("seconds"): continue
+        bump_streak(streaks, ALL, day)
+        for task, sec in r.get("tasks", {}).items():
+            if sec: bump_streak(streaks, task, day)
+    return streaks
+
+
+def current_streak(streaks, key, today):
+    """截至今天仍有效的连续天数：最后专注日是今天或昨天才算没断。"""
+    st = streaks.get(key)
+    if not st: return 0
+    return st["cur"] if (today - date.fromisoformat(st["last"])).days <= 1 else 0
+
+
+def rolling_avg(rollups, today, days, task=None):
+    """近 days 天（含今天）日均专注秒数。"""
+    total = 0
+    for i in range(days):
+        r = rollups.get((today - timedelta(days=i)).isoformat())
+        if r: total += r["seconds"] if task is None else r["tasks"].get(task, 0)
+    return total // days
+
+
+def consistency(rollups, today, days=30):
+    """近 days 天中有专注记录的天数占比（0~1）。"""
+    active = sum(1 for i in range(days) if (rollups.get((today - timedelta(days=i)).isoformat()) or {}).get("seconds"))
+    return active / days
+
+
+def goal_progress(tasks):
+    """({任务: 完成度 0~1}, 已达标任务数, 设了目标的任务数)；目标为任务的累计目标时长。"""
+    pct, done = {}, 0
+    for name, info in tasks.items():
+        tgt = info.get("target")
+        if isinstance(tgt, int) and tgt > 0:
+            pct[name] = min(1.0, int(info.get("total", 0)) / tgt)
+            done += pct[name] >= 1.0
+    return pct, done, len(pct)
@@ -11,15 +11,22 @@ FocusTimer v9 — 仅时间面板顺滑拖动/自适应字号 · 壁纸置于数
 
 可选依赖（推荐）:
     pip install pillow playsound pystray
+    pip install numpy        # 统计“分析”页向量化计算；不装则用纯 Python 回退
 打包（Windows 示例，无控制台）：
     pip install pyinstaller
     pyinstaller -F -w FocusTimer_v8.py
 """
 from __future__ import annotations
-import os, sys, json, time, random, threading
+import os, sys, time, queue, random, threading
 from datetime import datetime, timedelta, date
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog, colorchooser
+import analytics
+from storage import (DATA_DIR, DB_FILE, DEFAULT_DATA, EXPORT_FORMATS, SessionStore, day_epoch, iso_local, human_hms,
+                     load_data, save_data, flush_data, rebuild_rollups, focus_metrics, stats_summary, scan_import,
+                     merge_sessions, prepare_export, export_sessions, using_sqlite, migrate_to_sqlite, leave_sqlite,
+                     drain_inbox)
+from engine import PHASE_NAMES, SUSPEND_POLICIES, Clock, Timer, CycleTimer, Checkpoint, FocusEngine, pomodoro_plan
 
 # === Layout constants ===
 # 时间显示位置：相对于窗口中心的偏移量
@@ -56,88 +63,11 @@ except Exception:
 
 APP_NAME = "FocusTimer"
 APP_VER  = "v9"
-DATA_DIR = os.path.join(os.path.expanduser("~"), f".{APP_NAME.lower()}")
-os.makedirs(DATA_DIR, exist_ok=True)
-DATA_FILE = os.path.join(DATA_DIR, "data.json")
-
 IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
 AUDIO_EXTS = {".mp3", ".wav", ".ogg", ".m4a"}
 
-DEFAULT_DATA = {
-    # 窗口
-    "alpha": 0.98,
-    "always_on_top": False,
-
-    # 壁纸(主界面)
-    "wallpaper_main_file": None,    # 选单张
-    "wallpaper_main_dir": None,     # 选文件夹
-    "wallpaper_fit_pct": 92,        # 不铺满比例：图像显示为窗口较短边的 92%
-    "wallpaper_align": "center",    # 对齐：left/center/right + top/center/bottom（只做 center, top, bottom 简化）
-    "wallpaper_color_cache": {},    # 采样色缓存 {path:"#rrggbb"}
-
-    # 壁纸(仅时间)
-    "wallpaper_min_file": None,
-    "wallpaper_min_dir": None,
-    "wallpaper_min_fit_pct": 92,
-    "wallpaper_min_align": "center",
-
-    # 仅时间面板
-    "minimal_pos": None,            # [x,y]
-    "minimal_size": [560, 260],     # w,h
-    "minimal_font_base": 72,        # 基础字号，后续会根据窗口自适应
-    "minimal_show_future": True,
-    "minimal_show_notes": True,
-    "minimal_notes_memory": "",     # 在应用内的持久化草稿
-    "notes_save_path": None,        # 便签保存文件路径
-
-    # 提示音/音乐
-    "beep": True,
-    "sound_file": None,
-    "music_dir": None,
-    "music_shuffle": True,
-
-    # 任务（合并版）
-    "tasks": {"高等数学": {"total": 0, "target": 25*60}, "数学建模": {"total": 0, "target": None}},
-    "sessions": [],
-
-    # 未来
-    "future_events": [],
-    "future_unit": "混合",
-    "minimal_future_choice": "nearest",         # 月/天/小时/分钟/秒/混合
-    "time_color": "#000000",   # 时间字体颜色
-    "ui_tint_dynamic": True    # 根据壁纸自动调整按钮/菜单颜色
-}
-
-
-# --------- data io ---------
-def load_data():
-    if not os.path.exists(DATA_FILE):
-        save_data(DEFAULT_DATA)
-    try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception:
-        data = DEFAULT_DATA.copy(); save_data(data)
-    # 兼容 tasks int -> dict
-    if isinstance(data.get("tasks"), dict):
-        for k,v in list(data["tasks"].items()):
-            if isinstance(v, int):
-                data["tasks"][k] = {"total": v, "target": None}
-    for k,v in DEFAULT_DATA.items():
-        if k not in data: data[k] = v
-    return data
-
-def save_data(data):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
 
 # --------- helpers ---------
-def human_hms(sec: int) -> str:
-    h = sec // 3600; m = (sec % 3600) // 60; s = sec % 60
-    if h: return f"{h}小时{m}分{s}秒"
-    if m: return f"{m}分{s}秒"
-    return f"{s}秒"
-
 def fmt_future_delta(d: date, unit: str) -> str:
     now = datetime.now()
     tgt_dt = datetime.combine(d, datetime.min.time())
@@ -191,11 +121,130 @@ def avg_color_hex(path, fallback="#f0f0f3", data=None):
             b = sum(p[2] for p in px) // len(px)
             hexv = f"#{r:02x}{g:02x}{b:02x}"
             if data is not None:
-                data["wallpaper_color_cache"][path] = hexv; save_data(data)
+                data["wallpaper_color_cache"][path] = hexv; save_data(data, "wallpaper_color_cache")
             return hexv
     except Exception:
         return fallback
 
+# --------- background stats ---------
+class StatsWorker:
+    """统计后台线程：Tk 线程 submit(kind, fn, callback, *args)，fn 在后台执行，
+    结果经线程安全队列回到 Tk 线程调用 callback(result)。
+    每类请求有递增代号作为取消令牌：新请求到来后，尚未开始的旧请求直接跳过，已算出的旧结果也不发布。
+    只在有请求未完成时轮询结果队列，空闲时不占用定时器。"""
+    def __init__(self, root, poll_ms=40):
+        self.root = root; self.poll_ms = poll_ms
+        self._req = queue.Queue(); self._res = queue.Queue()
+        self._gen = {}; self._outstanding = 0; self._polling = False
+        threading.Thread(target=self._run, name="focustimer-stats", daemon=True).start()
+
+    def submit(self, kind, fn, callback, *args):
+        gen = self._gen[kind] = self._gen.get(kind, 0) + 1
+        self._outstanding += 1
+        self._req.put((kind, gen, fn, args, callback))
+        if not self._polling:
+            self._polling = True; self.root.after(self.poll_ms, self._poll)
+        return gen
+
+    def is_current(self, kind, gen):
+        return self._gen.get(kind) == gen
+
+    def _run(self):
+        while True:
+            kind, gen, fn, args, callback = self._req.get()
+            if not self.is_current(kind, gen):
+                self._res.put((kind, gen, None, None, None)); continue     # 已过期，不再计算
+            try:
+                res, err = fn(*args), None
+            except Exception as e:
+                res, err = None, e
+            self._res.put((kind, gen, callback, res, err))
+
+    def _poll(self):
+        while True:
+            try: kind, gen, callback, res, err = self._res.get_nowait()
+            except queue.Empty: break
+            self._outstanding -= 1
+            if callback is None or not self.is_current(kind, gen): continue
+            if err is not None:
+                print(f"[Stats] {kind} failed: {err!r}", file=sys.stderr); continue
+            try: callback(res)
+            except Exception as e: print(f"[Stats] {kind} callback failed: {e!r}", file=sys.stderr)
+        if self._outstanding > 0:
+            self.root.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
+
+# --------- widgets ---------
+class TreeSync:
+    """按稳定 id 对齐 Treeview 与目标行：只对新增/变化/消失的行发出 insert/item/delete，
+    刷新代价与变化量成正比。rows 为 [(iid, values), ...]，iid 需在一次刷新内唯一。"""
+    def __init__(self, tree):
+        self.tree = tree; self.shown = {}     # iid -> 上次写入的 values
+
+    def apply(self, rows):
+        tree = self.tree
+        rows = [(iid, tuple(values)) for iid, values in rows]
+        want = {iid for iid, _ in rows}
+        gone = [iid for iid in self.shown if iid not in want]
+        if gone:
+            tree.delete(*gone)
+            for iid in gone: del self.shown[iid]
+        for idx, (iid, values) in enumerate(rows):
+            old = self.shown.get(iid)
+            if old is None: tree.insert("", idx, iid=iid, values=values)
+            elif old != values: tree.item(iid, values=values)
+            self.shown[iid] = values
+        # 已有行的相对顺序变了（少见）才逐个挪动
+        order = [iid for iid, _ in rows]
+        if list(tree.get_children()) != order:
+            for idx, iid in enumerate(order): tree.move(iid, "", idx)
+
+class PagedTree:
+    """虚拟化的 Treeview：只保留“可见行数”个 item，滚动时从数据源取一页并原地改写这些行，
+    刷新代价与历史总量无关。count() -> 总行数；fetch(offset, n) -> 从 offset 起最多 n 行的 (iid, values)。"""
+    def __init__(self, parent, columns, headings, count, fetch):
+        self.count = count; self.fetch = fetch
+        self.offset = 0; self._total = 0; self._rows = 1
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=columns, show="headings")
+        for c,t in zip(columns, headings): self.tree.heading(c, text=t)
+        self.sb = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.sb.pack(side=tk.RIGHT, fill=tk.Y); self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.sync = TreeSync(self.tree)
+        self.tree.bind("<Configure>", lambda e: self.refresh())
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-3))     # X11 滚轮
+        self.tree.bind("<Button-5>", lambda e: self.scroll(3))
+        self.tree.bind("<Prior>", lambda e: self.scroll(-self._rows))
+        self.tree.bind("<Next>", lambda e: self.scroll(self._rows))
+
+    def pack(self, **kw): self.frame.pack(**kw)
+
+    def _visible_rows(self):
+        try: rh = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        except Exception: rh = 20
+        return max(1, self.tree.winfo_height() // rh - 1)     # 扣掉表头一行
+
+    def scroll(self, delta):
+        self.offset += delta; self.refresh()
+        return "break"
+
+    def _on_scrollbar(self, op, *args):
+        if op == "moveto":
+            self.offset = int(float(args[0]) * self._total)
+        elif op == "scroll":
+            self.offset += int(args[0]) * (self._rows if args[1] == "pages" else 1)
+        self.refresh()
+
+    def refresh(self):
+        self._total = total = self.count(); self._rows = rows = self._visible_rows()
+        self.offset = max(0, min(self.offset, total - rows))
+        page = self.fetch(self.offset, rows) if total else []
+        self.sync.apply(page)
+        if total: self.sb.set(self.offset / total, (self.offset + len(page)) / total)
+        else: self.sb.set(0, 1)
+
 # --------- main app ---------
 class FocusTimerApp(tk.Tk):
     def __init__(self):
@@ -210,9 +259,17 @@ class FocusTimerApp(tk.Tk):
         self.attributes("-alpha", self.data.get("alpha", 0.98))
         self.attributes("-topmost", self.data.get("always_on_top", False))
 
-        # 状态
-        self._timer_running = False
-        self._timer_paused  = False
+        # 状态：计时与记录都在无界面的引擎里，这里只有一个 after 唤醒
+        if self.data.get("suspend_policy") not in SUSPEND_POLICIES: self.data["suspend_policy"] = "count"   # 手改坏的设置
+        self.clock = Clock(self.data["suspend_policy"]); self.clock.on_jump = self._on_clock_jump
+        self.engine = FocusEngine(self.data, clock=self.clock, checkpoint=Checkpoint())
+        self.engine.on_record = self._on_session_recorded
+        self._tick_job = None
+        # 渲染：_render_time 只记下要显示的秒数，统一在一次回调里按差异写入控件
+        self._frame_sec = None; self._render_job = None; self._ticking = False
+        self._shown = {}                # 控件 -> 上次写入的选项值
+        self._stage_wh = (800, 400)
+        self._hidden = False            # 主窗口最小化/隐藏：不刷新看不见的控件
         self._mode = tk.StringVar(value="countdown")
         self._countdown_seconds = tk.IntVar(value=25*60)
 
@@ -234,6 +291,9 @@ class FocusTimerApp(tk.Tk):
         self._music_stop = threading.Event()
         self._music_pause = threading.Event()
 
+        # 统计在后台线程计算
+        self._stats = StatsWorker(self)
+
         # UI
         self._build_ui()
         self._apply_main_wallpaper()
@@ -241,6 +301,12 @@ class FocusTimerApp(tk.Tk):
         # 绑定尺寸变化重绘（含节流）
         self._repaint_scheduled = False
         self.layer.bind("<Configure>", self._on_layer_configure)
+        self.protocol("WM_DELETE_WINDOW", self._on_close)
+        # 命令行记下的会话放在 inbox 里，窗口获得焦点时并入
+        self.bind("<FocusIn>", lambda e: e.widget is self and self._drain_inbox())
+        self.bind("<Map>", lambda e: e.widget is self and self._update_power_mode())
+        self.bind("<Unmap>", lambda e: e.widget is self and self._update_power_mode())
+        self.after_idle(self._offer_resume)
 
 
     # ----- UI Tint helpers -----
@@ -280,10 +346,13 @@ class FocusTimerApp(tk.Tk):
         self._quote = tk.StringVar(value=self._load_random_or_direct_quote())
         ttk.Label(top, textvariable=self._quote, font=("Microsoft YaHei", 12)).pack(side=tk.LEFT)
         ttk.Button(top, text="导出记录", command=self._export_sessions).pack(side=tk.LEFT, padx=6)
+        ttk.Button(top, text="导入记录", command=self._import_sessions).pack(side=tk.LEFT)
         self.topmost_var = tk.BooleanVar(value=self.data.get("always_on_top", False))
         ttk.Checkbutton(top, text="置顶", variable=self.topmost_var, command=self._toggle_topmost).pack(side=tk.LEFT, padx=6)
         self.beep_var = tk.BooleanVar(value=self.data.get("beep", True))
         ttk.Checkbutton(top, text="提示音", variable=self.beep_var, command=self._toggle_beep).pack(side=tk.LEFT, padx=6)
+        self.suspend_var = tk.BooleanVar(value=self.data["suspend_policy"] == "count")
+        ttk.Checkbutton(top, text="休眠时照常计时", variable=self.suspend_var, command=self._toggle_suspend_policy).pack(side=tk.LEFT)
 
         # 分层容器
         self.layer = tk.Frame(self, bd=0, highlightthickness=0)
@@ -371,10 +440,24 @@ class FocusTimerApp(tk.Tk):
         for m in (25, 35):
             ttk.Button(bottom, text=f"{m}分钟", command=lambda mm=m: self._set_preset(mm)).pack(side=tk.LEFT, padx=4)
         ttk.Button(bottom, text="自定义", command=self._custom_time).pack(side=tk.LEFT, padx=4)
+        ttk.Button(bottom, text="番茄钟", command=self._pomodoro_dialog).pack(side=tk.LEFT, padx=4)
         self.btn_start = ttk.Button(bottom, text="开始", command=self.start_timer)
         self.btn_pause = ttk.Button(bottom, text="暂停", command=self.pause_timer, state=tk.DISABLED)
         self.btn_stop  = ttk.Button(bottom, text="停止/记录", command=self.stop_timer, state=tk.DISABLED)
         for b in (self.btn_start, self.btn_pause, self.btn_stop): b.pack(side=tk.LEFT, padx=6)
+        self.phase_label = ttk.Label(bottom, text=""); self.phase_label.pack(side=tk.LEFT, padx=6)
+
+        # 其他同时运行的计时器（休息提醒、秒表等）
+        panel = ttk.Frame(self.stage)
+        self.stage_timers_id = self.stage.create_window(0, 50, window=panel, anchor="ne")
+        self.timers_tree = ttk.Treeview(panel, columns=("name","task","time"), show="headings", height=3)
+        for c,t,wd in (("name","计时器",90), ("task","任务",90), ("time","时间",80)):
+            self.timers_tree.heading(c, text=t); self.timers_tree.column(c, width=wd, anchor=tk.CENTER)
+        self.timers_tree.pack(fill=tk.X)
+        pbar = ttk.Frame(panel); pbar.pack(fill=tk.X)
+        ttk.Button(pbar, text="添加计时器", command=self._add_timer_dialog).pack(side=tk.LEFT)
+        ttk.Button(pbar, text="暂停/继续", command=self._toggle_extra_timer).pack(side=tk.LEFT, padx=4)
+        ttk.Button(pbar, text="停止/记录", command=self._stop_extra_timer).pack(side=tk.LEFT)
 
         # 舞台尺寸变化时重排与重绘
         self.stage.bind("<Configure>", self._layout_timer_stage)
@@ -387,6 +470,7 @@ class FocusTimerApp(tk.Tk):
         self.stage.coords(self.stage_time_id, w//2 + TIME_X_OFFSET, h//2 + TIME_Y_OFFSET)
         # 底部条靠左下
         self.stage.coords(3, BOTTOM_MENU_X, min(h-10, int(getattr(self, "_main_img_bottom", int(h*0.75))) + BOTTOM_MENU_Y_OFFSET)) # bottom window id=3（创建顺序）
+        self.stage.coords(self.stage_timers_id, w-10, 50)
         # 背景重绘
         self._draw_timer_wallpaper()
         # 自适应字号（根据舞台高度以及字符长度）
@@ -432,12 +516,14 @@ class FocusTimerApp(tk.Tk):
             pass
 
     def _autoscale_timer_font(self, w, h):
-        txt = self.timer_label.cget("text")
+        self._stage_wh = (w, h)
+        self._apply(self.timer_label, font=self._timer_font(w, h, self._shown.get(self.timer_label, {}).get("text", "00:00:00")))
+
+    def _timer_font(self, w, h, txt):
         base = int(self.data.get("minimal_font_base", 72))
         # 根据高度和字符数综合估计
         k = max(28, int(min(h*0.28, w*0.12 / max(1,len(txt)))))
-        size = max(28, min(160, int((base + k) * 0.5)))
-        self.timer_label.configure(font=("Segoe UI", size, "bold"))
+        return ("Segoe UI", max(28, min(160, int((base + k) * 0.5))), "bold")
 
     # ----- Tasks -----
     def _build_tasks_page(self, parent):
@@ -446,18 +532,35 @@ class FocusTimerApp(tk.Tk):
         ttk.Button(bar, text="删除任务", command=self._del_task).pack(side=tk.LEFT, padx=6)
         ttk.Button(bar, text="设置目标", command=self._set_task_target).pack(side=tk.LEFT, padx=6)
 
-        cols = ("name","target","total","remain")
+        cols = ("name","target","total","remain","progress","streak","avg7")
         self.tasks_tree = ttk.Treeview(parent, columns=cols, show="headings", height=14)
-        for c,t in zip(cols, ("任务","目标","累计","剩余/倒计时")):
+        for c,t in zip(cols, ("任务","目标","累计","剩余/倒计时","完成度","连续天数","近7天日均")):
             self.tasks_tree.heading(c, text=t)
         self.tasks_tree.column("name", width=260, anchor=tk.W)
+        for c in ("progress","streak","avg7"): self.tasks_tree.column(c, width=80, anchor=tk.CENTER)
         self.tasks_tree.pack(fill=tk.BOTH, expand=True)
+        self.tasks_metrics = ttk.Label(parent, text=""); self.tasks_metrics.pack(anchor=tk.W, pady=(4,0))
+        self._tasks_sync = TreeSync(self.tasks_tree)
 
         self._refresh_tasks()
 
+    def _future_rows(self):
+        """[(稳定 id, 日期, 事件)]：同名同日的事件按出现次序编号。"""
+        out, seen = [], {}
+        for ev in self.data.get("future_events", []):
+            try:
+                d = datetime.strptime(ev["date"], "%Y-%m-%d").date()
+            except Exception:
+                continue
+            key = (ev["title"], ev["date"]); seen[key] = n = seen.get(key, 0) + 1
+            out.append((f"ev:{ev['date']}:{n}:{ev['title']}", d, ev))
+        return out
+
     def _refresh_tasks(self):
         if not hasattr(self, "tasks_tree"): return
-        for i in self.tasks_tree.get_children(): self.tasks_tree.delete(i)
+        rows = []
+        today = date.today(); roll = self.data.get("rollups") or {}; streaks = self.data.get("streaks") or {}
+        pct, _, _ = analytics.goal_progress(self.data.get("tasks", {}))
         # 普通任务
         for name, info in self.data.get("tasks", {}).items():
             tgt = info.get("target"); tot = int(info.get("total",0))
@@ -468,15 +571,22 @@ class FocusTimerApp(tk.Tk):
                 v_rem = (human_hms(rem) if rem>=0 else "超出"+human_hms(-rem))
             else:
                 v_rem = "-"
-            self.tasks_tree.insert("", tk.END, values=(name, v_tgt, v_tot, v_rem))
+            v_pct = f"{pct[name]*100:.0f}%" if name in pct else "-"
+            v_streak = analytics.current_streak(streaks, name, today)
+            v_avg = f"{analytics.rolling_avg(roll, today, 7, name)//60} 分"
+            rows.append((f"task:{name}", (name, v_tgt, v_tot, v_rem, v_pct, f"{v_streak} 天", v_avg)))
         # 未来映射
-        for ev in self.data.get("future_events", []):
-            try:
-                d = datetime.strptime(ev["date"], "%Y-%m-%d").date()
-                remain_txt = fmt_future_delta(d, self.data.get("future_unit","混合"))
-                self.tasks_tree.insert("", tk.END, values=(f"【未来】{ev['title']}", "-", "-", remain_txt))
-            except Exception:
-                continue
+        for iid, d, ev in self._future_rows():
+            remain_txt = fmt_future_delta(d, self.data.get("future_unit","混合"))
+            rows.append((iid, (f"【未来】{ev['title']}", "-", "-", remain_txt, "-", "-", "-")))
+        self._tasks_sync.apply(rows)
+        self.tasks_metrics.config(text=self._metrics_text(today))
+
+    def _metrics_text(self, today):
+        m = focus_metrics(self.data, today)
+        goals = f"{m['goals_done']}/{m['goals']}" if m["goals"] else "-"
+        return (f"连续专注 {m['streak']} 天（最长 {m['best']} 天） | 近7天日均 {m['avg7']//60} 分 | "
+                f"近30天日均 {m['avg30']//60} 分 | 近30天活跃 {m['consistency']*100:.0f}% | 目标达成 {goals}")
 
     def _add_task(self):
         name = self._prompt_text("新增任务", "输入任务名称")
@@ -484,14 +594,14 @@ class FocusTimerApp(tk.Tk):
         if name in self.data.get("tasks", {}):
             messagebox.showwarning("提示","该任务已存在"); return
         self.data["tasks"][name] = {"total":0, "target": None}
-        save_data(self.data); self._refresh_tasks()
+        save_data(self.data, "tasks"); self._refresh_tasks()
 
     def _del_task(self):
         sel = self.tasks_tree.selection()
         if not sel: return
         name = self.tasks_tree.item(sel[0], "values")[0]
         if name.startswith("【未来】"): return
-        self.data["tasks"].pop(name, None); save_data(self.data); self._refresh_tasks()
+        self.data["tasks"].pop(name, None); save_data(self.data, "tasks"); self._refresh_tasks()
 
     def _set_task_target(self):
         sel = self.tasks_tree.selection()
@@ -506,7 +616,7 @@ class FocusTimerApp(tk.Tk):
         ttk.Button(w, text="确定", command=lambda: self._apply_task_target(w, name, v.get()*60)).pack(side=tk.LEFT, padx=8)
 
     def _apply_task_target(self, w, name, tgt_sec):
-        self.data["tasks"][name]["target"] = int(tgt_sec); save_data(self.data); self._refresh_tasks(); w.destroy()
+        self.data["tasks"][name]["target"] = int(tgt_sec); save_data(self.data, "tasks"); self._refresh_tasks(); w.destroy()
 
     # ----- Future -----
     def _build_future_page(self, parent):
@@ -524,20 +634,17 @@ class FocusTimerApp(tk.Tk):
             self.future_tree.heading(c, text=t)
         self.future_tree.column("event", width=260, anchor=tk.W)
         self.future_tree.pack(fill=tk.BOTH, expand=True)
+        self._future_sync = TreeSync(self.future_tree)
         self._refresh_future()
 
     def _save_future_unit(self):
-        self.data["future_unit"] = self.future_unit_var.get(); save_data(self.data)
+        self.data["future_unit"] = self.future_unit_var.get(); save_data(self.data, "future_unit")
 
     def _refresh_future(self):
         if not hasattr(self,"future_tree"): return
-        for i in self.future_tree.get_children(): self.future_tree.delete(i)
-        for ev in self.data.get("future_events", []):
-            try:
-                d = datetime.strptime(ev["date"], "%Y-%m-%d").date()
-                self.future_tree.insert("", tk.END, values=(ev["title"], ev["date"], fmt_future_delta(d, self.data.get("future_unit","混合"))))
-            except Exception:
-                continue
+        unit = self.data.get("future_unit","混合")
+        self._future_sync.apply((iid, (ev["title"], ev["date"], fmt_future_delta(d, unit)))
+                                for iid, d, ev in self._future_rows())
 
     def _add_future(self):
         d0 = date.today() + timedelta(days=3)
@@ -555,45 +662,155 @@ class FocusTimerApp(tk.Tk):
                 messagebox.showerror("格式错误","日期无效"); return
             title = e_title.get().strip() or "未来事件"
             self.data.setdefault("future_events", []).append({"title": title, "date": dt.isoformat()})
-            save_data(self.data); self._refresh_future(); self._refresh_tasks(); w.destroy()
+            save_data(self.data, "future_events"); self._refresh_future(); self._refresh_tasks(); w.destroy()
         ttk.Button(frm, text="确定", command=ok).grid(row=2, column=0, columnspan=6, pady=6)
 
     def _del_future(self):
         sel = self.future_tree.selection()
         if not sel: return
-        idx = self.future_tree.index(sel[0])
-        if 0 <= idx < len(self.data.get("future_events", [])):
-            self.data["future_events"].pop(idx); save_data(self.data); self._refresh_future(); self._refresh_tasks()
+        for iid, _, ev in self._future_rows():
+            if iid == sel[0]:
+                self.data["future_events"].remove(ev); save_data(self.data, "future_events"); self._refresh_future(); self._refresh_tasks()
+                break
 
     # ----- Stats -----
-    def _build_stats_page(self, parent):
+    def _build_stats_page(self, page):
+        nb = ttk.Notebook(page); nb.pack(fill=tk.BOTH, expand=True)
+        parent = ttk.Frame(nb); nb.add(parent, text="概览")
+        tab_an = ttk.Frame(nb); nb.add(tab_an, text="分析")
+        self._build_analysis_tab(tab_an)
+
         box = ttk.Frame(parent); box.pack(fill=tk.X, pady=6)
         self.stats_summary = ttk.Label(box, text=""); self.stats_summary.pack(side=tk.LEFT)
-        self.sessions_tree = ttk.Treeview(parent, columns=("task","dur","start","end"), show="headings")
-        for c,t in zip(("task","dur","start","end"), ("任务","时长","开始","结束")):
-            self.sessions_tree.heading(c, text=t)
-        self.sessions_tree.pack(fill=tk.BOTH, expand=True, pady=6)
+        self.stats_metrics = ttk.Label(parent, text=""); self.stats_metrics.pack(anchor=tk.W)
+        # 全部历史可滚动浏览：只渲染可见的几十行，翻页时按需从会话存储取数据
+        self.sessions_view = PagedTree(parent, ("task","dur","start","end"), ("任务","时长","开始","结束"),
+                                       count=lambda: len(self.data["sessions"]), fetch=self._fetch_sessions_page)
+        self.sessions_view.pack(fill=tk.BOTH, expand=True, pady=6)
+        self.sessions_tree = self.sessions_view.tree
         bar = ttk.Frame(parent); bar.pack(fill=tk.X)
         ttk.Button(bar, text="刷新", command=self._update_stats_summary).pack(side=tk.LEFT)
         ttk.Button(bar, text="清空记录(谨慎)", command=self._clear_sessions).pack(side=tk.LEFT, padx=6)
+        ttk.Button(bar, text="重建汇总", command=self._rebuild_rollups).pack(side=tk.LEFT)
         self._update_stats_summary()
 
+    def _drain_inbox(self):
+        if drain_inbox(self.data): self._on_session_recorded(None)
+
     def _update_stats_summary(self):
-        today = date.today(); start_week = today - timedelta(days=today.weekday()); start_month = today.replace(day=1)
-        daily = weekly = monthly = 0; count_today = 0
-        for s in self.data.get("sessions", []):
-            end_dt = datetime.fromisoformat(s["end_iso"]).date()
-            if end_dt == today: daily += s["seconds"]; count_today += 1
-            if end_dt >= start_week: weekly += s["seconds"]
-            if end_dt >= start_month: monthly += s["seconds"]
+        # 历史列表只渲染可见行，留在 Tk 线程；汇总数字交给统计线程
+        self._drain_inbox()
+        self.sessions_view.refresh()
+        self.stats_metrics.config(text=self._metrics_text(date.today()))   # 只查按天汇总，直接算
+        if not self.stats_summary.cget("text"): self.stats_summary.config(text="统计中…")
+        self._stats.submit("summary", stats_summary, self._show_stats_summary, self.data, date.today())
+
+    def _show_stats_summary(self, res):
+        daily, weekly, monthly, count_today = res
         self.stats_summary.config(text=f"今日 {daily//60} 分 | 本周 {weekly//60} 分 | 本月 {monthly//60} 分 | 今日次数 {count_today}")
-        for i in self.sessions_tree.get_children(): self.sessions_tree.delete(i)
-        for s in reversed(self.data.get("sessions", [])[-500:]):
-            self.sessions_tree.insert("", tk.END, values=(s["task"], human_hms(s["seconds"]), s["start_iso"], s["end_iso"]))
+
+    # ----- Stats: analysis -----
+    _ANALYSIS_RANGES = ("今天", "本周", "本月", "近30天", "今年", "全部", "自定义")
+
+    def _build_analysis_tab(self, parent):
+        bar = ttk.Frame(parent); bar.pack(fill=tk.X, pady=6)
+        ttk.Label(bar, text="范围:").pack(side=tk.LEFT)
+        self.an_range_var = tk.StringVar(value="近30天")
+        cb = ttk.Combobox(bar, state="readonly", width=8, textvariable=self.an_range_var, values=self._ANALYSIS_RANGES)
+        cb.pack(side=tk.LEFT, padx=4)
+        cb.bind("<<ComboboxSelected>>", lambda e: self._update_analysis())
+        ttk.Label(bar, text="从").pack(side=tk.LEFT, padx=(10,2))
+        self.an_from_var = tk.StringVar(value=(date.today() - timedelta(days=29)).isoformat())
+        ttk.Entry(bar, textvariable=self.an_from_var, width=11).pack(side=tk.LEFT)
+        ttk.Label(bar, text="到").pack(side=tk.LEFT, padx=(6,2))
+        self.an_to_var = tk.StringVar(value=date.today().isoformat())
+        ttk.Entry(bar, textvariable=self.an_to_var, width=11).pack(side=tk.LEFT)
+        ttk.Button(bar, text="计算", command=lambda: (self.an_range_var.set("自定义"), self._update_analysis())).pack(side=tk.LEFT, padx=6)
+        self.an_info = ttk.Label(bar, text=""); self.an_info.pack(side=tk.LEFT, padx=10)
+
+        body = ttk.Frame(parent); body.pack(fill=tk.BOTH, expand=True)
+        left = ttk.Frame(body); left.pack(side=tk.LEFT, fill=tk.Y, padx=(0,6))
+        self.an_tasks_tree = ttk.Treeview(left, columns=("task","dur","pct"), show="headings", height=8)
+        for c,t in zip(("task","dur","pct"), ("任务","时长","占比")): self.an_tasks_tree.heading(c, text=t)
+        self.an_tasks_tree.column("task", width=140); self.an_tasks_tree.column("dur", width=110); self.an_tasks_tree.column("pct", width=60)
+        self.an_tasks_tree.pack(fill=tk.X)
+        self.an_len_tree = ttk.Treeview(left, columns=("len","n"), show="headings", height=len(analytics.LENGTH_EDGES_MIN))
+        for c,t in zip(("len","n"), ("单次时长","次数")): self.an_len_tree.heading(c, text=t)
+        self.an_len_tree.pack(fill=tk.X, pady=(6,0))
+        self._an_tasks_sync = TreeSync(self.an_tasks_tree); self._an_len_sync = TreeSync(self.an_len_tree)
+        right = ttk.Frame(body); right.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        ttk.Label(right, text="按开始小时（分钟）").pack(anchor=tk.W)
+        self.an_hours_cv = tk.Canvas(right, height=150, bg="white", highlightthickness=0); self.an_hours_cv.pack(fill=tk.X)
+        ttk.Label(right, text="按星期（分钟）").pack(anchor=tk.W, pady=(6,0))
+        self.an_wday_cv = tk.Canvas(right, height=150, bg="white", highlightthickness=0); self.an_wday_cv.pack(fill=tk.X)
+        self._an_result = None
+        for cv in (self.an_hours_cv, self.an_wday_cv): cv.bind("<Configure>", lambda e: self._draw_analysis_charts())
+        self._update_analysis()
+
+    def _analysis_range(self):
+        """当前选择 -> (lo, hi) epoch 秒，按会话结束时间过滤。"""
+        today = date.today(); r = self.an_range_var.get()
+        if r == "全部": return None, None
+        if r == "自定义":
+            d0 = date.fromisoformat(self.an_from_var.get().strip()); d1 = date.fromisoformat(self.an_to_var.get().strip())
+        else:
+            d1 = today
+            d0 = {"今天": today, "本周": today - timedelta(days=today.weekday()), "本月": today.replace(day=1),
+                  "近30天": today - timedelta(days=29), "今年": today.replace(month=1, day=1)}[r]
+            self.an_from_var.set(d0.isoformat()); self.an_to_var.set(d1.isoformat())
+        return day_epoch(d0), day_epoch(d1 + timedelta(days=1))
+
+    def _update_analysis(self):
+        try:
+            lo, hi = self._analysis_range()
+        except ValueError:
+            messagebox.showerror("格式错误", "日期格式应为 YYYY-MM-DD"); return
+        self.an_info.config(text="计算中…")
+        # 后台线程算的是列的副本（memcpy），Tk 线程同时追加会话也不会冲突
+        self._stats.submit("analysis", analytics.breakdown, self._show_analysis, self.data["sessions"].copy(), lo, hi)
+
+    def _show_analysis(self, res):
+        self._an_result = res
+        total = res["total"] or 1
+        self.an_info.config(text=f"共 {res['count']} 次 · {human_hms(res['total'])} · 引擎 {res['engine']}")
+        self._an_tasks_sync.apply((f"t:{name}", (name, human_hms(sec), f"{sec*100//total}%"))
+                                  for name, sec in sorted(res["tasks"].items(), key=lambda kv: -kv[1]))
+        self._an_len_sync.apply((f"l{i}", (lab, n)) for i, (lab, n) in enumerate(zip(analytics.length_labels(), res["lengths"])))
+        self._draw_analysis_charts()
+
+    def _draw_analysis_charts(self):
+        res = self._an_result
+        if res is None: return
+        self._draw_bars(self.an_hours_cv, [str(h) for h in range(24)], [v // 60 for v in res["hours"]])
+        self._draw_bars(self.an_wday_cv, list(analytics.WEEKDAY_NAMES), [v // 60 for v in res["weekdays"]])
+
+    def _draw_bars(self, cv, labels, values):
+        cv.delete("all")
+        w = max(1, cv.winfo_width()); h = max(1, cv.winfo_height())
+        top = max(values) or 1; slot = w / len(values); base = h - 16
+        for i, (lab, v) in enumerate(zip(labels, values)):
+            x0 = i*slot + slot*0.15; x1 = (i+1)*slot - slot*0.15
+            y = base - (base - 14) * v / top
+            cv.create_rectangle(x0, y, x1, base, fill="#5b8def", outline="")
+            cv.create_text((x0+x1)/2, h - 7, text=lab, font=("Segoe UI", 8))
+            if v: cv.create_text((x0+x1)/2, y - 6, text=str(v), font=("Segoe UI", 7))
+
+    def _fetch_sessions_page(self, offset, n):
+        # 按结束时间倒序，最新的在最上面（导入的乱序记录也能排到正确位置）
+        store = self.data["sessions"]; last = len(store) - 1
+        rows = []
+        for k in range(last - offset, max(-1, last - offset - n), -1):
+            i = store.by_end(k); s = store.record(i)
+            rows.append((f"s{i}", (s["task"], human_hms(s["seconds"]), iso_local(s["start"]), iso_local(s["end"]))))
+        return rows
 
     def _clear_sessions(self):
         if messagebox.askyesno("确认","确定清空所有历史会话记录？累计总时长会保留。"):
-            self.data["sessions"] = []; save_data(self.data); self._update_stats_summary()
+            self.data["sessions"] = SessionStore(); self.data["rollups"] = {}; self.data["streaks"] = {}
+            save_data(self.data, "sessions", "rollups", "streaks"); self._update_stats_summary(); self._refresh_tasks()
+
+    def _rebuild_rollups(self):
+        rebuild_rollups(self.data); save_data(self.data, "rollups", "streaks"); self._update_stats_summary(); self._refresh_tasks()
 
     # ----- Settings -----
     def _build_settings_page(self, parent):
@@ -635,6 +852,9 @@ class FocusTimerApp(tk.Tk):
         self.show_notes_var  = tk.BooleanVar(value=self.data.get("minimal_show_notes", True))
         ttk.Checkbutton(fm_m1, text="显示未来倒计时", variable=self.show_future_var, command=self._save_minimal_toggles).pack(side=tk.LEFT, padx=6)
         ttk.Checkbutton(fm_m1, text="显示便签",   variable=self.show_notes_var, command=self._save_minimal_toggles).pack(side=tk.LEFT, padx=6)
+        self.minimal_minutes_var = tk.BooleanVar(value=self.data.get("minimal_minutes", False))
+        ttk.Checkbutton(fm_m1, text="主窗口最小化时按分钟显示(省电)", variable=self.minimal_minutes_var,
+                        command=self._save_minimal_toggles).pack(side=tk.LEFT, padx=6)
 
         fm_m_sel = ttk.LabelFrame(tab_min, text="未来倒计时显示"); fm_m_sel.pack(fill=tk.X, padx=10, pady=8)
         ttk.Label(fm_m_sel, text="显示事件:").pack(side=tk.LEFT, padx=6)
@@ -658,6 +878,14 @@ class FocusTimerApp(tk.Tk):
         self.tint_var = tk.BooleanVar(value=self.data.get("ui_tint_dynamic", True))
         ttk.Checkbutton(sec2, text="根据壁纸平均色自动调整按钮/菜单颜色", variable=self.tint_var, command=self._save_tint_toggle).pack(side=tk.LEFT, padx=6, pady=6)
 
+        # 数据存储
+        tab_data = ttk.Frame(p); p.add(tab_data, text="数据")
+        sec3 = ttk.LabelFrame(tab_data, text="存储后端"); sec3.pack(fill=tk.X, padx=10, pady=8)
+        self.backend_var = tk.StringVar(value=self._backend_text())
+        ttk.Label(sec3, textvariable=self.backend_var).pack(side=tk.LEFT, padx=6, pady=6)
+        ttk.Button(sec3, text="迁移到 SQLite", command=self._migrate_sqlite).pack(side=tk.LEFT, padx=6)
+        ttk.Button(sec3, text="切换回 JSON", command=self._export_back_json).pack(side=tk.LEFT, padx=6)
+
         ttk.Button(fm_m2, text="选择便签保存文件", command=self._choose_notes_path).pack(side=tk.LEFT, padx=6, pady=6)
         self.notes_path_var = tk.StringVar(value=self.data.get("notes_save_path") or "")
         ttk.Entry(fm_m2, textvariable=self.notes_path_var, width=48, state="readonly").pack(side=tk.LEFT, padx=6)
@@ -665,15 +893,15 @@ class FocusTimerApp(tk.Tk):
     def _apply_fit_pct(self, which, val):
         val = int(val); val = max(50, min(100, val))
         if which=="main":
-            self.data["wallpaper_fit_pct"] = val; save_data(self.data); self._apply_main_wallpaper()
+            self.data["wallpaper_fit_pct"] = val; save_data(self.data, "wallpaper_fit_pct"); self._apply_main_wallpaper()
         else:
-            self.data["wallpaper_min_fit_pct"] = val; save_data(self.data); self._apply_min_wallpaper()
+            self.data["wallpaper_min_fit_pct"] = val; save_data(self.data, "wallpaper_min_fit_pct"); self._apply_min_wallpaper()
 
     def _apply_align_and_fit(self, which):
         if which=="main":
-            self.data["wallpaper_align"] = self.align_main.get(); save_data(self.data); self._apply_main_wallpaper()
+            self.data["wallpaper_align"] = self.align_main.get(); save_data(self.data, "wallpaper_align"); self._apply_main_wallpaper()
         else:
-            self.data["wallpaper_min_align"] = self.align_min.get(); save_data(self.data); self._apply_min_wallpaper()
+            self.data["wallpaper_min_align"] = self.align_min.get(); save_data(self.data, "wallpaper_min_align"); self._apply_min_wallpaper()
 
     def _choose_wallpaper(self, single: bool, which: str):
         if single:
@@ -691,14 +919,16 @@ class FocusTimerApp(tk.Tk):
         except Exception:
             pass
 
-        save_data(self.data)
+        save_data(self.data, "wallpaper_main_file", "wallpaper_main_dir", "wallpaper_min_file", "wallpaper_min_dir")
         if which=="main": self._apply_main_wallpaper()
         else: self._apply_min_wallpaper()
 
     def _save_minimal_toggles(self):
         self.data["minimal_show_future"] = self.show_future_var.get()
         self.data["minimal_show_notes"]  = self.show_notes_var.get()
-        save_data(self.data)
+        self.data["minimal_minutes"]     = self.minimal_minutes_var.get()
+        save_data(self.data, "minimal_show_future", "minimal_show_notes", "minimal_minutes")
+        self._update_power_mode()
 
     def _refresh_minimal_future_choice(self):
         events = self.data.get("future_events", [])
@@ -725,7 +955,7 @@ class FocusTimerApp(tk.Tk):
         else:
             title = v.split("（",1)[0].split(" (",1)[0].strip()
             self.data["minimal_future_choice"] = title or "nearest"
-        save_data(self.data)
+        save_data(self.data, "minimal_future_choice")
         try: self._update_minimal_nearest_future()
         except Exception: pass
 
@@ -733,13 +963,13 @@ class FocusTimerApp(tk.Tk):
         p = filedialog.asksaveasfilename(title="选择/创建便签保存文件", defaultextension=".txt",
                                          filetypes=[("Text","*.txt"),("All","*.*")])
         if not p: return
-        self.data["notes_save_path"] = p; save_data(self.data); self.notes_path_var.set(p)
+        self.data["notes_save_path"] = p; save_data(self.data, "notes_save_path"); self.notes_path_var.set(p)
 
 
     def _choose_time_color(self):
         c = colorchooser.askcolor(color=self.data.get("time_color", "#000000"), title="选择时间字体颜色")
         if c and c[1]:
-            self.data["time_color"] = c[1]; save_data(self.data)
+            self.data["time_color"] = c[1]; save_data(self.data, "time_color")
             # 应用到主/仅时间标签与预览
             try:
                 self.timer_label.configure(fg=c[1])
@@ -754,8 +984,29 @@ class FocusTimerApp(tk.Tk):
             except Exception:
                 pass
 
+    def _backend_text(self):
+        return f"当前：SQLite（{DB_FILE}）" if using_sqlite() else f"当前：JSON 分片（{DATA_DIR}）"
+
+    def _migrate_sqlite(self):
+        if using_sqlite(): messagebox.showinfo("数据", "已在使用 SQLite"); return
+        try:
+            migrate_to_sqlite(self.data)
+        except Exception as e:
+            messagebox.showerror("数据", "迁移失败："+str(e)); return
+        self.backend_var.set(self._backend_text())
+        messagebox.showinfo("数据", f"已迁移 {len(self.data.get('sessions', []))} 条记录到 SQLite，JSON 分片保留为备份")
+
+    def _export_back_json(self):
+        if not using_sqlite(): messagebox.showinfo("数据", "当前已是 JSON 存储"); return
+        if not messagebox.askyesno("数据", "写回 JSON 分片并停用 SQLite？（data.db 会改名备份）"): return
+        try:
+            leave_sqlite()
+        except Exception as e:
+            messagebox.showerror("数据", "导出失败："+str(e)); return
+        self.backend_var.set(self._backend_text())
+
     def _save_tint_toggle(self):
-        self.data["ui_tint_dynamic"] = bool(self.tint_var.get()); save_data(self.data)
+        self.data["ui_tint_dynamic"] = bool(self.tint_var.get()); save_data(self.data, "ui_tint_dynamic")
         # 立即重绘一次以生效/失效
         self._apply_main_wallpaper()
         if self.minimal_win: self._draw_min_wallpaper(force=True)
@@ -774,73 +1025,188 @@ class FocusTimerApp(tk.Tk):
         self._countdown_seconds.set(int(m)*60); self._mode.set("countdown"); self._render_time(self._countdown_seconds.get()); w.destroy()
 
     def _render_time(self, sec):
-        self.timer_label.config(text=time.strftime("%H:%M:%S", time.gmtime(max(0, sec))), fg=self.data.get("time_color", "#000000"))
-        # 自适应字号（舞台尺寸可能改变）
-        self._autoscale_timer_font(self.stage.winfo_width() or 800, self.stage.winfo_height() or 400)
+        """记下这一帧要显示的秒数；tick 内由 tick 结束时统一写入，其余场合合并到一次 idle 回调。"""
+        self._frame_sec = max(0, sec)
+        if not self._ticking and self._render_job is None:
+            self._render_job = self.after_idle(self._flush_render)
+
+    def _flush_render(self):
+        """按差异写入：文字、颜色、字号都没变的控件不碰；通常每秒只有主时间（和仅时间窗）一次 configure。"""
+        self._render_job = None
+        if self._frame_sec is None: return
+        txt = time.strftime("%H:%M:%S", time.gmtime(self._frame_sec)); self._frame_sec = None
+        if not self._hidden:
+            w, h = self._stage_wh
+            self._apply(self.timer_label, text=txt, fg=self.data.get("time_color", "#000000"), font=self._timer_font(w, h, txt))
         # 更新仅时间
         if self.minimal_label is not None:
-            self.minimal_label.config(text=self.timer_label.cget("text"))
+            self._apply(self.minimal_label, text=txt[:5] if self.engine.timers.step == 60 else txt)
         if self.minimal_info is not None and self.data.get("minimal_show_future", True):
-            self._update_minimal_nearest_future()
+            self._apply(self.minimal_info, text=self._minimal_future_text())
+
+    def _apply(self, widget, **opts):
+        """只把与上次写入值不同的选项合并成一次 configure。"""
+        last = self._shown.setdefault(widget, {})
+        changed = {k: v for k, v in opts.items() if last.get(k) != v}
+        if changed:
+            widget.configure(**changed); last.update(changed)
 
     def start_timer(self):
-        if self._timer_running: return
-        self._timer_running = True; self._timer_paused = False
-        self.btn_start.config(state=tk.DISABLED); self.btn_pause.config(state=tk.NORMAL); self.btn_stop.config(state=tk.NORMAL)
-        if self._mode.get()=="countdown":
-            total = self._countdown_seconds.get(); self._render_time(total)
-            def run():
-                remain = total
-                while self._timer_running and remain>0:
-                    if not self._timer_paused:
-                        remain -= 1
-                        self.after(0, lambda r=remain: self._render_time(r))
-                        time.sleep(1)
-                    else:
-                        time.sleep(0.1)
-                self.after(0, lambda: self._finish_session(total-remain))
-            threading.Thread(target=run, daemon=True).start()
-        else:
-            def run():
-                t0 = time.time()
-                while self._timer_running:
-                    if not self._timer_paused:
-                        sec = int(time.time()-t0)
-                        self.after(0, lambda s=sec: self._render_time(s))
-                        time.sleep(1)
-                    else:
-                        time.sleep(0.1)
-            threading.Thread(target=run, daemon=True).start()
+        if self.engine.main_tid is not None: return
+        mode = self._mode.get()
+        task = self.task_var.get() if hasattr(self, "task_var") else None
+        self._started(self.engine.start(mode, self._countdown_seconds.get() if mode == "countdown" else 0, task=task, main=True))
+
+    def _pomodoro_dialog(self):
+        if self.engine.main_tid is not None: return
+        cfg = dict(DEFAULT_DATA["pomodoro"], **self.data.get("pomodoro", {}))
+        w = tk.Toplevel(self); w.title("番茄钟")
+        fields = (("work","专注(分)"), ("short","短休息(分)"), ("long","长休息(分)"), ("every","每几个专注长休息"), ("cycles","轮数"))
+        vars_ = {}
+        for r, (k, text) in enumerate(fields):
+            ttk.Label(w, text=text).grid(row=r, column=0, sticky=tk.W, padx=6, pady=2)
+            vars_[k] = tk.IntVar(value=int(cfg[k])); tk.Spinbox(w, from_=1, to=600, textvariable=vars_[k], width=8).grid(row=r, column=1)
+        def ok():
+            self.data["pomodoro"] = {k: max(1, int(v.get())) for k, v in vars_.items()}; save_data(self.data, "pomodoro")
+            task = self.task_var.get() if hasattr(self, "task_var") else None
+            self._started(self.engine.start_cycle(pomodoro_plan(self.data["pomodoro"]), task=task, main=True)); w.destroy()
+        ttk.Button(w, text="开始", command=ok).grid(row=len(fields), column=0, columnspan=2, pady=6)
+
+    def _started(self, t):
+        if t.main:
+            self.btn_start.config(state=tk.DISABLED); self.btn_stop.config(state=tk.NORMAL)
+            self.btn_pause.config(state=tk.NORMAL, text="继续" if t.paused else "暂停")
+        self._show_timer(t); self._arm_tick()
+
+    def _tick(self):
+        """唯一的 tick：引擎处理到点的计时器，这里只按事件刷新显示，再按堆顶约下一次唤醒；不开线程、不轮询。"""
+        self._tick_job = None; self._ticking = True
+        try:
+            for kind, t, _ in self.engine.tick():
+                if kind == "show": self._show_timer(t)
+                elif kind == "phase":
+                    if self.data.get("beep", True): self._play_alarm()
+                else: self._timer_finished(t)
+        finally:
+            self._ticking = False
+        self._flush_render()
+        self._arm_tick()
+
+    def _offer_resume(self):
+        """上次退出/崩溃时仍有计时器在走：询问继续计时、记录已用时间，还是放弃。"""
+        states = self.engine.interrupted()
+        if not states: return
+        lines = [f"{st.get('name') or ('主计时器' if st.get('main') else '计时器')}"
+                 f"（{st.get('task') or '不记录'}）：已用 {human_hms(int(Timer.state_elapsed(st)))}" for st in states]
+        ans = messagebox.askyesnocancel("恢复计时", "上次退出时以下计时器仍在运行：\n" + "\n".join(lines) +
+                                        "\n\n是：继续计时    否：按已用时间记录    取消：放弃")
+        restored = self.engine.restore(states if ans is not None else [], resume=bool(ans))
+        for t in restored:
+            if t.main:
+                self._mode.set("countdown" if t.mode == "cycle" else t.mode)
+                if t.mode == "countdown": self._countdown_seconds.set(t.total)
+                if t.task in self.data.get("tasks", {}): self.task_var.set(t.task)
+            self._started(t)
+
+    def _update_power_mode(self):
+        """按可见性选显示粒度：主窗口可见时每秒；最小化后只剩仅时间窗时每秒或（设置了）每分钟；
+        都看不见时不刷新任何控件，只在倒计时结束/阶段切换（和刷新检查点）时醒来。"""
+        hidden = self.state() in ("iconic", "withdrawn")
+        if not hidden: step = 1
+        elif self.minimal_win is None: step = None
+        else: step = 60 if self.data.get("minimal_minutes", False) else 1
+        was_hidden = self._hidden; self._hidden = hidden
+        self.engine.set_granularity(step)
+        if was_hidden and not hidden:       # 回到前台：补上隐藏期间跳过的显示
+            for t in list(self.engine.timers.timers.values()): self._show_timer(t)
+        elif self.engine.main is not None:
+            self._show_timer(self.engine.main)
+        self._arm_tick()
+
+    def _arm_tick(self):
+        if self._tick_job is not None:
+            self.after_cancel(self._tick_job); self._tick_job = None
+        d = self.engine.next_deadline()
+        if d is None: return        # 没有在走的计时器（全部暂停时也一样）：不留任何定时唤醒
+        self._tick_job = self.after(max(0, int((d - self.engine.clock()) * 1000)) + 1, self._tick)
+
+    def _show_timer(self, t):
+        phase = None
+        if isinstance(t, CycleTimer):
+            i = t.phase(); phase = f"{PHASE_NAMES[t.plan[i][0]]} {t.work_no[i]}/{t.works}"
+        if t.main:
+            sec = t.shown()
+            if self.engine.timers.step == 60 and t.mode != "countup": sec = -(-sec // 60) * 60  # 按分钟显示：倒计时向上取整
+            self._render_time(sec)
+            if not self._hidden: self._apply(self.phase_label, text=phase or "")
+        elif not self._hidden:
+            text = (f"{phase} " if phase else "") + time.strftime("%H:%M:%S", time.gmtime(t.shown())) + (" ⏸" if t.paused else "")
+            iid = f"t{t.id}"
+            if self.timers_tree.exists(iid): self.timers_tree.set(iid, "time", text)
+            else: self.timers_tree.insert("", tk.END, iid=iid, values=(t.name, t.task or "-", text))
+
+    def _toggle_pause(self, tid):
+        t = self.engine.toggle_pause(tid)
+        if t is not None: self._show_timer(t); self._arm_tick()
+        return t
 
     def pause_timer(self):
-        if not self._timer_running: return
-        self._timer_paused = not self._timer_paused
-        self.btn_pause.config(text="继续" if self._timer_paused else "暂停")
+        t = self._toggle_pause(self.engine.main_tid)
+        if t is not None: self.btn_pause.config(text="继续" if t.paused else "暂停")
 
     def stop_timer(self):
-        if not self._timer_running: return
-        shown = self.timer_label.cget("text"); h,m,s = map(int, shown.split(":"))
-        used = h*3600+m*60+s
-        if self._mode.get()=="countdown": used = self._countdown_seconds.get()-used
-        self._finish_session(max(0, used))
-
-    def _finish_session(self, used_seconds: int):
-        self._timer_running = False; self._timer_paused = False
-        self.btn_start.config(state=tk.NORMAL); self.btn_pause.config(text="暂停", state=tk.DISABLED); self.btn_stop.config(state=tk.DISABLED)
+        if self.engine.main_tid is not None: self._finish_session(self.engine.main_tid)
+
+    def _selected_extra(self):
+        sel = self.timers_tree.selection()
+        return int(sel[0][1:]) if sel else None
+
+    def _toggle_extra_timer(self):
+        tid = self._selected_extra()
+        if tid is not None: self._toggle_pause(tid)
+
+    def _stop_extra_timer(self):
+        tid = self._selected_extra()
+        if tid is not None: self._finish_session(tid)
+
+    _NO_TASK = "（不记录）"
+
+    def _add_timer_dialog(self):
+        w = tk.Toplevel(self); w.title("添加计时器")
+        name = tk.StringVar(value="休息提醒"); mode = tk.StringVar(value="countdown"); mins = tk.IntVar(value=5)
+        task = tk.StringVar(value=self._NO_TASK)
+        ttk.Label(w, text="名称").grid(row=0, column=0, padx=6, pady=4); ttk.Entry(w, textvariable=name, width=16).grid(row=0, column=1, columnspan=2)
+        ttk.Radiobutton(w, text="倒计时", value="countdown", variable=mode).grid(row=1, column=0)
+        ttk.Radiobutton(w, text="正计时", value="countup", variable=mode).grid(row=1, column=1)
+        ttk.Label(w, text="分钟").grid(row=2, column=0); tk.Spinbox(w, from_=1, to=600, textvariable=mins, width=8).grid(row=2, column=1)
+        ttk.Label(w, text="任务").grid(row=3, column=0)
+        ttk.Combobox(w, state="readonly", textvariable=task, width=14,
+                     values=[self._NO_TASK] + list(self.data.get("tasks", {}))).grid(row=3, column=1, columnspan=2)
+        def ok():
+            self._started(self.engine.start(mode.get(), int(mins.get()) * 60 if mode.get() == "countdown" else 0,
+                                            task=None if task.get() == self._NO_TASK else task.get(),
+                                            name=name.get().strip() or "计时器"))
+            w.destroy()
+        ttk.Button(w, text="开始", command=ok).grid(row=4, column=0, columnspan=3, pady=6)
+
+    def _finish_session(self, tid=None):
+        """结束计时器 tid（默认主计时器）：引擎把尚未记录的时间记到它绑定的任务，这里收拾界面。"""
+        t = self.engine.get(self.engine.main_tid if tid is None else tid)
+        if t is None: return
+        self.engine.finish(t.id); self._timer_finished(t)
+
+    def _timer_finished(self, t):
+        if t.main:
+            self.btn_start.config(state=tk.NORMAL); self.btn_pause.config(text="暂停", state=tk.DISABLED); self.btn_stop.config(state=tk.DISABLED)
+            self._render_time(0); self._apply(self.phase_label, text="")
+        if self.timers_tree.exists(f"t{t.id}"):
+            self.timers_tree.delete(f"t{t.id}")
+        self._arm_tick()
         if self.data.get("beep", True): self._play_alarm()
-        if used_seconds>0 and self.data.get("tasks"):
-            # 记录到第一个任务（或可扩展为下拉选择）
-            k = self.task_var.get() if hasattr(self, "task_var") and self.task_var.get() in self.data["tasks"] else next(iter(self.data["tasks"].keys()))
-            self.data["tasks"][k]["total"] = int(self.data["tasks"][k].get("total",0)) + used_seconds
-            now = datetime.now()
-            self.data.setdefault("sessions", []).append({
-                "task": k,
-                "seconds": used_seconds,
-                "start_iso": (now - timedelta(seconds=used_seconds)).isoformat(timespec="seconds"),
-                "end_iso": now.isoformat(timespec="seconds")
-            })
-            save_data(self.data); self._refresh_tasks()
-        self._render_time(0)
+
+    def _on_session_recorded(self, rec):
+        self._refresh_tasks()
+        if hasattr(self, "stats_metrics"): self.stats_metrics.config(text=self._metrics_text(date.today()))
 
     def _play_alarm(self):
         def worker():
@@ -860,7 +1226,7 @@ class FocusTimerApp(tk.Tk):
 
     # ----- Minimal (Time-only) -----
     def _toggle_minimal(self):
-        if self.minimal_win is None: self._open_minimal()
+        if self.minimal_win is None: self._open_minimal(); self._update_power_mode()
         else: self._close_minimal()
 
     def _pick_min(self):
@@ -935,10 +1301,15 @@ class FocusTimerApp(tk.Tk):
             try: self._save_minimal_pos()
             except Exception: pass
             self.minimal_win.destroy()
+        for wdg in (self.minimal_label, self.minimal_info): self._shown.pop(wdg, None)
         self.minimal_win=None; self.minimal_label=None; self.minimal_info=None; self.minimal_bg=None; self.minimal_notes=None
+        self._update_power_mode()
 
     def _update_minimal_nearest_future(self):
         if self.minimal_info is None: return
+        self._apply(self.minimal_info, text=self._minimal_future_text())
+
+    def _minimal_future_text(self):
         today = datetime.now().date()
         events = []
         for ev in self.data.get("future_events", []):
@@ -949,8 +1320,7 @@ class FocusTimerApp(tk.Tk):
                 continue
         upcoming = sorted([(d,ev) for d,ev in events if d >= today], key=lambda x: x[0])
         if not upcoming:
-            self.minimal_info.config(text="")
-            return
+            return ""
         pref = self.data.get("minimal_future_choice", "nearest")
         chosen = None
         if pref not in (None, "", "nearest"):
@@ -960,8 +1330,7 @@ class FocusTimerApp(tk.Tk):
         if not chosen:
             chosen = upcoming[0]
         d, ev = chosen
-        text = f"{ev.get('title', '未来事件')} · " + fmt_future_delta(d, self.data.get("future_unit","混合"))
-        self.minimal_info.config(text=text)
+        return f"{ev.get('title', '未来事件')} · " + fmt_future_delta(d, self.data.get("future_unit","混合"))
 
     def _start_drag(self, e): self._drag_off = (e.x, e.y)
     def _on_drag_smooth(self, e):
@@ -972,7 +1341,7 @@ class FocusTimerApp(tk.Tk):
 
     def _save_minimal_pos(self, _=None):
         if self.minimal_win is None: return
-        self.data["minimal_pos"] = [self.minimal_win.winfo_x(), self.minimal_win.winfo_y()]; save_data(self.data)
+        self.data["minimal_pos"] = [self.minimal_win.winfo_x(), self.minimal_win.winfo_y()]; save_data(self.data, "minimal_pos")
 
     
         try:
@@ -987,7 +1356,7 @@ class FocusTimerApp(tk.Tk):
         mw, mh = self.data.get("minimal_size", [560,260])
         mw = max(280, mw + step)
         mh = max(160, mh + int(step*0.5))
-        self.data["minimal_size"] = [mw, mh]; save_data(self.data)
+        self.data["minimal_size"] = [mw, mh]; save_data(self.data, "minimal_size")
         self.minimal_win.geometry(f"{mw}x{mh}+{self.minimal_win.winfo_x()}+{self.minimal_win.winfo_y()}")
 
     def _on_minimal_configure(self, e):
@@ -1042,7 +1411,7 @@ class FocusTimerApp(tk.Tk):
     def _choose_music_dir(self):
         d = filedialog.askdirectory(title="选择音乐文件夹")
         if not d: return
-        self.data["music_dir"] = d; save_data(self.data)
+        self.data["music_dir"] = d; save_data(self.data, "music_dir")
 
     def _toggle_music(self):
         if self._music_thr and self._music_thr.is_alive():
@@ -1085,7 +1454,7 @@ class FocusTimerApp(tk.Tk):
         if self.minimal_notes is None: return
         txt = self.minimal_notes.get("1.0", tk.END).strip()
         self.data["minimal_notes_memory"] = txt
-        save_data(self.data)
+        save_data(self.data, "minimal_notes_memory")
         p = self.data.get("notes_save_path")
         if p:
             try:
@@ -1101,12 +1470,94 @@ class FocusTimerApp(tk.Tk):
 
     # ----- Common -----
     def _export_sessions(self):
-        path = filedialog.asksaveasfilename(title="导出JSON", defaultextension=".json", filetypes=[("JSON","*.json")])
+        w = tk.Toplevel(self); w.title("导出记录")
+        frm = ttk.Frame(w); frm.pack(padx=10, pady=10)
+        ttk.Label(frm, text="格式").grid(row=0, column=0, sticky=tk.W)
+        fmt = tk.StringVar(value="JSON")
+        ttk.Combobox(frm, state="readonly", width=8, textvariable=fmt, values=list(EXPORT_FORMATS)).grid(row=0, column=1, sticky=tk.W)
+        ttk.Label(frm, text="任务").grid(row=0, column=2, padx=(10,0))
+        task = tk.StringVar(value="全部")
+        ttk.Combobox(frm, state="readonly", width=12, textvariable=task,
+                     values=["全部"] + list(self.data.get("tasks", {}))).grid(row=0, column=3)
+        ttk.Label(frm, text="从(含)").grid(row=1, column=0, sticky=tk.W, pady=6)
+        since = tk.StringVar(); ttk.Entry(frm, textvariable=since, width=11).grid(row=1, column=1, sticky=tk.W)
+        ttk.Label(frm, text="到(含)").grid(row=1, column=2, padx=(10,0))
+        until = tk.StringVar(); ttk.Entry(frm, textvariable=until, width=11).grid(row=1, column=3, sticky=tk.W)
+        ttk.Label(frm, text="日期 YYYY-MM-DD，留空为不限").grid(row=2, column=0, columnspan=4, sticky=tk.W)
+        bar = ttk.Progressbar(frm, length=300, mode="determinate"); bar.grid(row=3, column=0, columnspan=4, pady=8)
+        msg = ttk.Label(frm, text=""); msg.grid(row=4, column=0, columnspan=4, sticky=tk.W)
+        cancel = threading.Event()
+        btn = ttk.Button(frm, text="导出", command=lambda: self._start_export(w, fmt.get(), task.get(), since.get(), until.get(), bar, msg, btn, cancel))
+        btn.grid(row=5, column=0, columnspan=4)
+        w.protocol("WM_DELETE_WINDOW", lambda: (cancel.set(), w.destroy()))
+
+    def _start_export(self, w, fmt, task, since, until, bar, msg, btn, cancel):
+        try:
+            d0 = date.fromisoformat(since.strip()) if since.strip() else None
+            d1 = date.fromisoformat(until.strip()) + timedelta(days=1) if until.strip() else None
+        except ValueError:
+            messagebox.showerror("格式错误", "日期格式应为 YYYY-MM-DD", parent=w); return
+        ext = EXPORT_FORMATS[fmt]
+        path = filedialog.asksaveasfilename(parent=w, title=f"导出{fmt}", defaultextension=ext, filetypes=[(fmt, f"*{ext}")])
         if not path: return
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump({"sessions": self.data.get("sessions", []), "tasks": self.data.get("tasks", {}),
-                       "future_events": self.data.get("future_events", [])}, f, ensure_ascii=False, indent=2)
-        messagebox.showinfo("完成", f"已导出到 {path}")
+        store, idx, extra = prepare_export(self.data, d0, d1, None if task == "全部" else task)
+        # 后台线程只写进度字典，界面用 after 轮询，避免跨线程碰 Tk
+        st = {"done": 0, "total": len(idx), "error": None, "finished": False}
+        def work():
+            try:
+                export_sessions(store, idx, extra, path, fmt,
+                                progress=lambda done, total: st.update(done=done), cancel=cancel)
+            except Exception as e:
+                st["error"] = e
+            st["finished"] = True
+        btn.config(state=tk.DISABLED); bar.config(maximum=max(1, len(idx)), value=0)
+        threading.Thread(target=work, name="focustimer-export", daemon=True).start()
+        def poll():
+            if not w.winfo_exists(): return
+            bar.config(value=st["done"]); msg.config(text=f"{st['done']} / {st['total']}")
+            if not st["finished"]:
+                w.after(100, poll); return
+            btn.config(state=tk.NORMAL)
+            if st["error"] is not None:
+                if not cancel.is_set(): messagebox.showerror("导出失败", str(st["error"]), parent=w)
+            else:
+                messagebox.showinfo("完成", f"已导出 {st['total']} 条到 {path}", parent=w); w.destroy()
+        poll()
+
+    def _import_sessions(self):
+        path = filedialog.askopenfilename(title="导入记录", filetypes=[("导出文件","*.json *.jsonl *.csv"),("All","*.*")])
+        if not path: return
+        w = tk.Toplevel(self); w.title("导入记录")
+        bar = ttk.Progressbar(w, length=300, mode="determinate", maximum=1); bar.pack(padx=10, pady=(10,4))
+        msg = ttk.Label(w, text=os.path.basename(path)); msg.pack(padx=10, pady=(0,10))
+        cancel = threading.Event()
+        w.protocol("WM_DELETE_WINDOW", lambda: (cancel.set(), w.destroy()))
+        # 解析与判重在后台线程；合并回 self.data 回到 Tk 线程做
+        known = self.data["sessions"].copy()       # 只复制三列 array，判重在后台线程上二分
+        st = {"done": 0, "total": 1, "result": None, "error": None}
+        def work():
+            try:
+                st["result"] = scan_import(path, known, progress=lambda done, total: st.update(done=done, total=total), cancel=cancel)
+            except Exception as e:
+                st["error"] = e
+        threading.Thread(target=work, name="focustimer-import", daemon=True).start()
+        def poll():
+            if not w.winfo_exists(): return
+            bar.config(maximum=st["total"], value=st["done"])
+            if st["result"] is None and st["error"] is None:
+                w.after(100, poll); return
+            if st["error"] is not None:
+                messagebox.showerror("导入失败", str(st["error"]), parent=w); w.destroy(); return
+            rows, dup, bad = st["result"]
+            added = merge_sessions(self.data, rows)
+            self._refresh_task_choices(); self._refresh_tasks(); self._update_stats_summary()
+            w.destroy()
+            messagebox.showinfo("导入完成", f"新增 {added} 条，跳过重复 {dup + len(rows) - added} 条" + (f"，无效 {bad} 条" if bad else ""))
+        poll()
+
+    def _refresh_task_choices(self):
+        try: self.task_box["values"] = list(self.data.get("tasks", {}))
+        except Exception: pass
 
     def _prompt_text(self, title, tip):
         w = tk.Toplevel(self); w.title(title)
@@ -1117,9 +1568,21 @@ class FocusTimerApp(tk.Tk):
         w.grab_set(); w.wait_window(); return v.get().strip() if res["ok"] else None
 
     def _toggle_topmost(self):
-        v = self.topmost_var.get(); self.attributes("-topmost", v); self.data["always_on_top"] = v; save_data(self.data)
+        v = self.topmost_var.get(); self.attributes("-topmost", v); self.data["always_on_top"] = v; save_data(self.data, "always_on_top")
     def _toggle_beep(self):
-        self.data["beep"] = self.beep_var.get(); save_data(self.data)
+        self.data["beep"] = self.beep_var.get(); save_data(self.data, "beep")
+    def _toggle_suspend_policy(self):
+        self.clock.policy = self.data["suspend_policy"] = "count" if self.suspend_var.get() else "discard"
+        save_data(self.data, "suspend_policy")
+
+    def _on_clock_jump(self, kind, sec):
+        # 休眠醒来时 Tk 的定时器可能还按休眠前的剩余时间等待：按新的截止时刻重新约一次
+        if kind == "suspend": self.after_idle(self._arm_tick)
+
+    def _on_close(self):
+        # 退出前把后台尚未写出的修改落盘；仍在走的计时器留在检查点里，下次启动时询问
+        if len(self.engine.timers): self.engine.save_checkpoint()
+        self.engine.checkpoint.close(); flush_data(); self.destroy()
 
 # ---- entry ----
     def _auto_font_minimal_by_wh(self, w, h, text):
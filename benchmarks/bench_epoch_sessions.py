@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+会话时间戳 ISO 字符串 -> 整数 epoch 的性能对比（10 万条会话）
+================================================================================
+    python benchmarks/bench_epoch_sessions.py [条数]
+1) 统计刷新：逐条解析 end_iso 累加今日/本周/本月（旧）对比 storage.stats_summary 查按天汇总，
+   以及本周任务分布：旧循环对比 SessionStore.totals 按结束时间二分取区间；
+2) load_data：旧版 ISO 会话分片对比迁移后的 epoch 分片（只读加载，不触发后台迁移写盘）。
+在临时目录里运行，不碰 ~/.focustimer；每项取 3 次中最快的一次。
+"""
+import os, sys, time, random, shutil, tempfile
+from datetime import datetime, timedelta, date
+
+HOME = tempfile.mkdtemp(prefix="focustimer-bench-")
+os.environ["HOME"] = os.environ["USERPROFILE"] = HOME      # storage 导入时按家目录定位数据目录
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+TASKS = ("高等数学", "数学建模", "英语", "物理")
+
+
+def best(fn, runs=3):
+    out = None; t_best = float("inf")
+    for _ in range(runs):
+        t = time.perf_counter(); out = fn(); t_best = min(t_best, time.perf_counter() - t)
+    return t_best, out
+
+
+def build_records(n):
+    """n 条按时间递增的会话，覆盖最近约一年半；返回 (ISO 记录列表, epoch 记录列表)。"""
+    rnd = random.Random(42); st = int(time.time()) - n * 480
+    iso, epoch = [], []
+    for _ in range(n):
+        st += rnd.randint(300, 660); sec = rnd.randint(5, 90) * 60; task = rnd.choice(TASKS)
+        iso.append({"task": task, "seconds": sec, "start_iso": storage.iso_local(st), "end_iso": storage.iso_local(st + sec)})
+        epoch.append(storage.session_record(task, st, sec))
+    return iso, epoch
+
+
+def refresh_iso(sessions, today):
+    """旧的统计刷新：每条会话解析一次 end_iso。"""
+    start_week = today - timedelta(days=today.weekday()); start_month = today.replace(day=1)
+    daily = weekly = monthly = 0
+    for s in sessions:
+        d = datetime.fromisoformat(s["end_iso"]).date()
+        if d == today: daily += s["seconds"]
+        if d >= start_week: weekly += s["seconds"]
+        if d >= start_month: monthly += s["seconds"]
+    return daily, weekly, monthly
+
+
+def totals_iso(sessions, since, until):
+    """旧的任务分布：同样逐条解析 end_iso。"""
+    acc = {}
+    for s in sessions:
+        if since <= datetime.fromisoformat(s["end_iso"]).date() < until:
+            acc[s["task"]] = acc.get(s["task"], 0) + s["seconds"]
+    return acc
+
+
+def write_shards(sessions, store):
+    data = dict(storage.DEFAULT_DATA, sessions=sessions)
+    data["rollups"] = storage.rebuild_rollups({"sessions": store})
+    storage._write_shards(data, storage.SHARD_FILES)
+
+
+def main():
+    print(f"{N} 条会话，临时数据目录 {storage.DATA_DIR}")
+    iso, epoch = build_records(N)
+    store = storage.SessionStore(epoch); today = date.today()
+    data = {"sessions": store, "rollups": storage.rebuild_rollups({"sessions": store})}
+
+    t_iso, r_iso = best(lambda: refresh_iso(iso, today))
+    t_ep, r_ep = best(lambda: storage.stats_summary(data, today))
+    assert r_iso == r_ep[:3], (r_iso, r_ep)
+    print(f"统计刷新  ISO 解析 {t_iso * 1000:7.1f} ms | stats_summary {t_ep * 1000:7.2f} ms | {t_iso / t_ep:6.0f}x")
+
+    since, until = today - timedelta(days=today.weekday()), today + timedelta(days=1)
+    lo, hi = storage.day_epoch(since), storage.day_epoch(until)
+    t_iso, r_iso = best(lambda: totals_iso(iso, since, until))
+    t_ep, r_ep = best(lambda: store.totals(lo, hi))
+    assert r_iso == r_ep, (r_iso, r_ep)
+    print(f"本周分布  ISO 解析 {t_iso * 1000:7.1f} ms | SessionStore.totals {t_ep * 1000:7.2f} ms | {t_iso / t_ep:6.0f}x")
+
+    write_shards(iso, store)
+    t_old, d_old = best(lambda: storage.load_data(readonly=True))
+    write_shards(store, store)
+    t_new, d_new = best(lambda: storage.load_data(readonly=True))
+    assert len(d_old["sessions"]) == len(d_new["sessions"]) == N
+    print(f"load_data 旧 ISO 分片 {t_old * 1000:7.1f} ms | epoch 分片 {t_new * 1000:7.1f} ms | {t_old / t_new:4.1f}x")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        storage.flush_data(); shutil.rmtree(HOME, ignore_errors=True)
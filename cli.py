@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FocusTimer 命令行（不加载 Tk / PIL）
+================================================================================
+    python cli.py start 25 --task 高等数学      # 终端里倒计时，结束或 Ctrl+C 时记录
+    python cli.py start --up --task 数学建模    # 正计时
+    python cli.py stats --week                  # 今日(默认)/本周/本月/全部 的时长与任务分布
+    python cli.py export --since 2026-10-01 -o out.csv
+与图形界面共用同一个数据目录，可以同时运行：命令行只读数据文件，
+完成的会话写进 inbox，由界面进程（或下一次启动）去重后并入。
+"""
+from __future__ import annotations
+import sys, time, argparse
+from datetime import date, timedelta
+
+import storage
+from engine import FocusEngine
+
+
+class _Inbox:
+    """命令行的存储：会话不直接写日志，交给界面进程并入。"""
+    @staticmethod
+    def append_session(data, rec):
+        storage.post_session(rec)
+
+
+def _date(s):
+    try:
+        return date.fromisoformat(s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"日期格式应为 YYYY-MM-DD：{s}")
+
+
+def cmd_start(args):
+    mode = "countup" if args.up else "countdown"
+    # 不读数据文件：任务不存在时由并入方新建
+    eng = FocusEngine({"tasks": {args.task: {"total": 0, "target": None}}}, storage=_Inbox)
+    t = eng.start(mode, int(args.minutes * 60) if mode == "countdown" else 0, task=args.task, main=True)
+    out = sys.stdout
+    try:
+        while True:
+            out.write(f"\r{args.task}  {time.strftime('%H:%M:%S', time.gmtime(t.shown()))} "); out.flush()
+            d = eng.next_deadline()
+            time.sleep(max(0.0, d - eng.clock()) + 0.001)
+            if any(kind == "finish" for kind, _, _ in eng.tick()): break
+        used = t.used()
+    except KeyboardInterrupt:
+        used = eng.finish()
+    out.write(f"\n已记录 {storage.human_hms(used)} → {args.task}\n" if used > 0 else "\n未记录\n")
+    return 0
+
+
+def cmd_stats(args):
+    data = storage.load_data(readonly=True); today = date.today()
+    if args.week: since, title = today - timedelta(days=today.weekday()), "本周"
+    elif args.month: since, title = today.replace(day=1), "本月"
+    elif args.all: since, title = None, "全部"
+    else: since, title = today, "今日"
+    totals = storage.task_totals(data, since, today + timedelta(days=1))
+    total = sum(totals.values())
+    print(f"{title}{f'（{since} 起）' if since and since != today else ''}：{storage.human_hms(total)}")
+    width = max((len(k) for k in totals), default=0)
+    for task, sec in sorted(totals.items(), key=lambda kv: -kv[1]):
+        print(f"  {task.ljust(width)}  {storage.human_hms(sec)}  {sec * 100 // max(1, total)}%")
+    m = storage.focus_metrics(data, today)
+    print(f"连续专注 {m['streak']} 天（最长 {m['best']} 天） | 近7天日均 {m['avg7'] // 60} 分 | "
+          f"近30天日均 {m['avg30'] // 60} 分 | 近30天活跃 {m['consistency'] * 100:.0f}%")
+    return 0
+
+
+def cmd_export(args):
+    data = storage.load_data(readonly=True)
+    until = args.until + timedelta(days=1) if args.until else None
+    store, idx, extra = storage.prepare_export(data, args.since, until, args.task)
+    if args.output:
+        n = storage.export_sessions(store, idx, extra, args.output, args.format)
+        print(f"已导出 {n} 条 → {args.output}", file=sys.stderr)
+    else:
+        for chunk, _ in storage.iter_export_chunks(store, idx, args.format, extra):
+            sys.stdout.write(chunk)
+    return 0
+
+
+def build_parser():
+    p = argparse.ArgumentParser(prog="focustimer", description="FocusTimer 命令行")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    s = sub.add_parser("start", help="开始计时，结束或 Ctrl+C 时记录")
+    s.add_argument("minutes", nargs="?", type=float, default=25, help="倒计时分钟数（默认 25）")
+    s.add_argument("--task", default="默认任务")
+    s.add_argument("--up", action="store_true", help="正计时")
+    s.set_defaults(func=cmd_start)
+    s = sub.add_parser("stats", help="专注时长统计")
+    g = s.add_mutually_exclusive_group()
+    g.add_argument("--week", action="store_true"); g.add_argument("--month", action="store_true")
+    g.add_argument("--all", action="store_true")
+    s.set_defaults(func=cmd_stats)
+    s = sub.add_parser("export", help="导出会话记录（默认写到标准输出）")
+    s.add_argument("--since", type=_date); s.add_argument("--until", type=_date, help="含当天")
+    s.add_argument("--task")
+    s.add_argument("--format", choices=tuple(storage.EXPORT_FORMATS), default="CSV")
+    s.add_argument("-o", "--output")
+    s.set_defaults(func=cmd_export)
+    return p
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+# -*- coding: utf-8 -*-
+"""
+FocusTimer 计时/记录引擎（不依赖 Tk）
+================================================================================
+计时用的时钟层（识别休眠/墙钟跳变）、计时器（倒计时/正计时/番茄钟）、按截止时刻排序的调度堆、运行中检查点，
+以及把它们和存储接起来的 FocusEngine。
+时钟与存储都可注入：图形界面只负责显示，脚本、命令行和压测可以直接驱动同一套逻辑。
+"""
+from __future__ import annotations
+import os, sys, json, time, heapq, bisect
+
+import storage as _storage
+from storage import DATA_DIR, session_record
+
+# --------- clock ---------
+SUSPEND_POLICIES = ("count", "discard")
+JUMP_MIN = 1.0          # 两个时钟之差的变化超过这么多秒才算休眠/墙钟跳变（两次读数间的噪声只有微秒级）
+
+def _clock_sources():
+    """(不含休眠的单调钟, 含休眠的单调钟)：Linux 为 CLOCK_MONOTONIC / CLOCK_BOOTTIME，
+    macOS 为 mach 时基 / CLOCK_MONOTONIC，Windows 为 QueryUnbiasedInterruptTime / time.monotonic；
+    都拿不到时两者相同，即不识别休眠。"""
+    if hasattr(time, "CLOCK_BOOTTIME"):
+        return time.monotonic, lambda: time.clock_gettime(time.CLOCK_BOOTTIME)
+    if sys.platform == "darwin" and hasattr(time, "CLOCK_MONOTONIC"):
+        return time.monotonic, lambda: time.clock_gettime(time.CLOCK_MONOTONIC)
+    if sys.platform == "win32":
+        try:
+            import ctypes
+            unbiased = ctypes.windll.kernel32.QueryUnbiasedInterruptTime; buf = ctypes.c_ulonglong()
+            def awake():
+                unbiased(ctypes.byref(buf)); return buf.value / 1e7      # 100ns 为单位
+            awake()
+            return awake, time.monotonic
+        except (ImportError, AttributeError, OSError):
+            pass
+    return time.monotonic, time.monotonic
+
+class Clock:
+    """计时用时钟（可调用，返回秒）：单调、不受校时/夏令时影响，并在每次读数时识别系统休眠与墙钟跳变。
+    policy 为 "count" 时休眠期间照常计时（CLOCK_BOOTTIME 语义），"discard" 时不计入（相当于休眠时自动暂停）；
+    运行中改 policy 不会让读数跳变。awake/boot/wall 三个时间源都可注入，换成模拟时钟即可重放休眠和校时。
+    发现跳变时调用 on_jump(类型, 秒数)：("suspend", 休眠时长) 或 ("wall", 墙钟相对单调钟的偏移)。"""
+    def __init__(self, policy="count", awake=None, boot=None, wall=time.time):
+        if awake is None or boot is None:
+            a, b = _clock_sources(); awake = awake or a; boot = boot or b
+        self.awake, self.boot, self.wall = awake, boot, wall
+        self.policy = policy; self.on_jump = None
+        self.suspended = 0.0        # 累计识别到的休眠秒数
+        self._a, self._b, self._w = awake(), boot(), wall()
+        self._now = self._b
+
+    @property
+    def policy(self):
+        return self._policy
+
+    @policy.setter
+    def policy(self, v):
+        if v not in SUSPEND_POLICIES: raise ValueError(f"未知的休眠策略：{v!r}")
+        self._policy = v
+
+    def __call__(self):
+        a, b, w = self.awake(), self.boot(), self.wall()
+        da, db = a - self._a, b - self._b
+        self._a, self._b, self._w, w0 = a, b, w, self._w
+        self._now += da if self.policy == "discard" else db
+        gap, skew = db - da, (w - w0) - db
+        if gap > JUMP_MIN:
+            self.suspended += gap
+            if self.on_jump is not None: self.on_jump("suspend", gap)
+        if abs(skew) > JUMP_MIN and self.on_jump is not None: self.on_jump("wall", skew)
+        return self._now
+
+# --------- timers ---------
+class Timer:
+    """一个计时器：只记 time.monotonic() 的起点与累计暂停时长，已用/剩余时间随时由时钟换算，
+    不依赖循环计数，渲染耗时和调度抖动不会积累成误差。mode 为 "countdown"（total 秒）或 "countup"。
+    task 为结束时记入的任务（None 表示不记录，如休息提醒）；id 由 TimerManager 分配，main 标记界面上的主计时器。"""
+    def __init__(self, mode, total=0, task=None, name="", clock=time.monotonic):
+        self.mode = mode; self.total = int(total); self.task = task; self.name = name; self.clock = clock
+        self.started = clock(); self.paused_at = None; self.paused_sec = 0.0
+        self.id = None; self.gen = 0; self.main = False
+
+    @property
+    def paused(self):
+        return self.paused_at is not None
+
+    def elapsed(self):
+        now = self.paused_at if self.paused_at is not None else self.clock()
+        return max(0.0, now - self.started - self.paused_sec)
+
+    def remaining(self):
+        return max(0.0, self.total - self.elapsed())
+
+    def done(self):
+        return self.mode == "countdown" and self.remaining() <= 0
+
+    def shown(self):
+        """当前应显示的整秒数：倒计时向上取整（开始时显示满格、归零即结束），正计时向下取整。"""
+        if self.mode == "countdown": return int(-(-self.remaining() // 1))
+        return int(self.elapsed())
+
+    def used(self):
+        """应记录的专注秒数。"""
+        return self.total if self.done() else int(self.elapsed())
+
+    def next_change(self, step=1):
+        """距离显示值下一次跨过 step 秒的整数倍还有多少秒（step=1 即下一个秒边界，60 为按分钟显示）。"""
+        if self.mode == "countdown":
+            frac = self.remaining() % step
+            return frac if frac > 0 else step
+        return step - self.elapsed() % step
+
+    def next_event(self):
+        """距离下一个必须处理的时刻（倒计时结束）还有多少秒；正计时没有，返回 None。"""
+        return self.remaining() if self.mode == "countdown" else None
+
+    def pause(self):
+        if self.paused_at is None: self.paused_at = self.clock()
+
+    def resume(self):
+        if self.paused_at is not None:
+            self.paused_sec += self.clock() - self.paused_at; self.paused_at = None
+
+    def to_state(self, wall=None):
+        """可跨进程保存的状态：monotonic 时刻换算成墙钟（start 已扣除 monotonic 与墙钟之差）。"""
+        wall = time.time() if wall is None else wall; now = self.clock()
+        return {"mode": self.mode, "total": self.total, "task": self.task, "name": self.name,
+                "start": wall - (now - self.started), "paused_sec": self.paused_sec,
+                "paused_at": None if self.paused_at is None else wall - (now - self.paused_at), "saved": wall}
+
+    @staticmethod
+    def state_elapsed(st):
+        """检查点里记录的已用秒数（截至最后一次写检查点或暂停时）。"""
+        end = st["paused_at"] if st.get("paused_at") is not None else st["saved"]
+        return max(0.0, end - st["start"] - st.get("paused_sec", 0.0))
+
+    @classmethod
+    def from_state(cls, st, clock=time.monotonic):
+        """按检查点重建计时器：从中断时的已用时间接着走，停机期间不计入。"""
+        if st["mode"] == "cycle":
+            t = CycleTimer(st["plan"], st.get("task"), st.get("name", ""), clock); t.seen = int(st.get("seen", 0))
+        else:
+            t = cls(st["mode"], st.get("total", 0), st.get("task"), st.get("name", ""), clock)
+        t.started = t.clock() - cls.state_elapsed(st)
+        if st.get("paused_at") is not None: t.paused_at = t.started + cls.state_elapsed(st)
+        return t
+
+PHASE_NAMES = {"work": "专注", "short": "短休息", "long": "长休息"}
+
+def pomodoro_plan(cfg):
+    """按番茄钟设置预先展开整段计划 [(阶段, 秒)]：专注后接短休息，每 every 个专注换成长休息，共 cycles 轮。"""
+    work, short, long_ = (max(1, int(cfg.get(k, d))) * 60 for k, d in (("work", 25), ("short", 5), ("long", 15)))
+    every = max(1, int(cfg.get("every", 4))); plan = []
+    for _ in range(max(1, int(cfg.get("cycles", 1)))):
+        for i in range(1, every + 1):
+            plan += [("work", work), ("long", long_) if i == every else ("short", short)]
+    return plan
+
+class CycleTimer(Timer):
+    """番茄钟：整段计划连同各阶段的累计结束点预先算好，一个计时器从头走到尾，
+    当前阶段由已用时间二分查找得到；阶段切换自动进行，不新建计时器、线程或控件。
+    只有专注阶段计入任务：completed() 交出走完的阶段，used() 为当前专注阶段尚未记录的秒数。"""
+    def __init__(self, plan, task=None, name="番茄钟", clock=time.monotonic):
+        self.plan = [(kind, int(n)) for kind, n in plan]; self.ends = []; self.work_no = []; acc = works = 0
+        for kind, n in self.plan:
+            acc += n; works += kind == "work"; self.ends.append(acc); self.work_no.append(works)
+        self.works = works
+        super().__init__("cycle", acc, task, name, clock)
+        self.seen = 0           # 已交出（记录/提示过）的阶段数
+
+    def phase(self):
+        return min(bisect.bisect_right(self.ends, self.elapsed()), len(self.plan) - 1)
+
+    def done(self):
+        return self.elapsed() >= self.total
+
+    def shown(self):
+        return int(-(-(self.ends[self.phase()] - self.elapsed()) // 1))
+
+    def next_change(self, step=1):
+        frac = (self.ends[self.phase()] - self.elapsed()) % step
+        return frac if frac > 0 else step
+
+    def next_event(self):
+        return max(0.0, self.ends[self.phase()] - self.elapsed())
+
+    def used(self):
+        if self.done(): return 0
+        i = self.phase(); kind, n = self.plan[i]
+        return int(self.elapsed() - (self.ends[i] - n)) if kind == "work" else 0
+
+    def completed(self):
+        """自上次调用以来走完的阶段 [(阶段, 秒, 结束时的已用秒数)]。"""
+        n = bisect.bisect_right(self.ends, self.elapsed())
+        out = [(*self.plan[k], self.ends[k]) for k in range(self.seen, n)]
+        self.seen = max(self.seen, n)
+        return out
+
+    def to_state(self, wall=None):
+        return dict(super().to_state(wall), plan=self.plan, seen=self.seen)
+
+CHECKPOINT_FILE = os.path.join(DATA_DIR, "running.json")
+CHECKPOINT_SIZE = 4096      # 定长：原地覆盖写，不换文件、不改文件大小
+CHECKPOINT_SEC = 15         # 计时中每隔多久刷新一次"最后存活时刻"
+
+class Checkpoint:
+    """运行中计时器的检查点：一个定长（CHECKPOINT_SIZE 的整数倍）JSON 文件，空格补齐后从头覆盖写。
+    只防进程崩溃/被杀，不 fsync；读到半截写入时按无检查点处理。"""
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path; self._fd = None
+
+    def read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                blob = json.loads(f.read() or "{}")
+            return blob if isinstance(blob, dict) and blob.get("timers") else None
+        except (OSError, ValueError):
+            return None
+
+    def write(self, timers, main_tid=None, wall=None):
+        """timers 为 TimerManager.timers；main_tid 对应的计时器标记为主计时器。"""
+        wall = time.time() if wall is None else wall
+        blob = json.dumps({"timers": [dict(t.to_state(wall), main=(tid == main_tid)) for tid, t in timers.items()]},
+                          ensure_ascii=False).encode("utf-8")
+        size = -(-max(1, len(blob)) // CHECKPOINT_SIZE) * CHECKPOINT_SIZE
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        os.lseek(self._fd, 0, os.SEEK_SET); os.write(self._fd, blob.ljust(size))
+        if os.fstat(self._fd).st_size > size: os.ftruncate(self._fd, size)
+
+    def close(self):
+        if self._fd is not None: os.close(self._fd); self._fd = None
+
+class TimerManager:
+    """同时运行的多个计时器：按"下一次显示变化时刻"排成小根堆，全部共用一个唤醒源——
+    调用方只需在 next_deadline() 时刻醒来一次，取 pop_due() 逐个渲染/结束。
+    暂停、删除不去堆里找元素：计时器的 gen 递增后，旧堆项出堆时按代号作废。
+    step 为显示粒度：1 每秒、60 每分钟，None 表示没人看——只在倒计时结束/阶段切换时醒来。"""
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock; self.timers = {}; self._heap = []; self._ids = 0; self._seq = 0
+        self.step = 1
+
+    def __len__(self): return len(self.timers)
+
+    def get(self, tid):
+        return self.timers.get(tid)
+
+    def add(self, timer):
+        self._ids += 1; timer.id = self._ids
+        self.timers[timer.id] = timer; self._push(timer)
+        return timer.id
+
+    def remove(self, tid):
+        t = self.timers.pop(tid, None)
+        if t is not None: t.gen += 1
+        return t
+
+    def pause(self, tid):
+        t = self.timers[tid]; t.pause(); t.gen += 1
+
+    def resume(self, tid):
+        t = self.timers[tid]; t.resume(); t.gen += 1; self._push(t)
+
+    def set_step(self, step):
+        """切换显示粒度：在走的计时器按新粒度重新入堆（旧堆项靠 gen 作废）。"""
+        if step == self.step: return
+        self.step = step
+        for t in self.timers.values():
+            t.gen += 1
+            if not t.paused: self._push(t)
+
+    def running(self):
+        return any(not t.paused for t in self.timers.values())
+
+    def _push(self, t):
+        delay = t.next_change(self.step) if self.step else t.next_event()
+        if delay is None: return        # 不显示的正计时：没有要醒来的时刻
+        self._seq += 1
+        heapq.heappush(self._heap, (self.clock() + delay, self._seq, t.id, t.gen))
+
+    def _live(self, entry):
+        t = self.timers.get(entry[2])
+        return t is not None and t.gen == entry[3] and not t.paused
+
+    def next_deadline(self):
+        """最早的下一次唤醒时刻（monotonic 秒），没有在走的计时器时为 None。"""
+        h = self._heap
+        while h and not self._live(h[0]): heapq.heappop(h)
+        return h[0][0] if h else None
+
+    def pop_due(self, now=None):
+        """取出到点的计时器；还没结束的按各自的下一个秒边界重新入堆，已结束的留给调用方 remove。"""
+        now = self.clock() if now is None else now
+        h, out = self._heap, []
+        while h and h[0][0] <= now:
+            entry = heapq.heappop(h)
+            if not self._live(entry): continue
+            t = self.timers[entry[2]]; out.append(t)
+            if not t.done(): self._push(t)
+        return out
+
+
+# --------- engine ---------
+class FocusEngine:
+    """计时与会话记录的核心，不含任何界面代码。
+
+    clock 为单调时钟（计时用，默认为新的 Clock()），wall 为墙钟（会话的结束时刻）；storage 只需提供
+    append_session(data, rec)，默认就是 storage 模块。调用方在 next_deadline() 时刻调用一次 tick()，
+    按返回的事件 [(类型, 计时器, 值)] 更新显示：("show", t, 秒数)、("phase", t, 阶段)、("finish", t, 记录秒数)。
+    每记录一条会话都会调用 on_record(rec)（若设置）。"""
+    def __init__(self, data, storage=None, clock=None, wall=time.time, checkpoint=None):
+        self.data = data; self.storage = storage if storage is not None else _storage
+        self.clock = Clock() if clock is None else clock; self.wall = wall
+        self.timers = TimerManager(self.clock)
+        self.checkpoint = checkpoint; self.main_tid = None; self._saved_at = None
+        self.on_record = None
+
+    # ----- 计时器 -----
+    def start(self, mode, total=0, task=None, name="", main=False):
+        return self.add(Timer(mode, total, task, name, self.clock), main)
+
+    def start_cycle(self, plan, task=None, name="番茄钟", main=False):
+        return self.add(CycleTimer(plan, task, name, self.clock), main)
+
+    def add(self, timer, main=False):
+        tid = self.timers.add(timer)
+        if main: self.main_tid = tid; timer.main = True
+        self.save_checkpoint()
+        return timer
+
+    def get(self, tid):
+        return self.timers.get(tid)
+
+    @property
+    def main(self):
+        return self.timers.get(self.main_tid)
+
+    def toggle_pause(self, tid):
+        t = self.timers.get(tid)
+        if t is None: return None
+        if t.paused: self.timers.resume(tid)
+        else: self.timers.pause(tid)
+        self.save_checkpoint()
+        return t
+
+    def set_granularity(self, step):
+        """显示粒度：1 每秒、60 每分钟、None 不显示（窗口隐藏时），见 TimerManager.step。"""
+        self.timers.set_step(step)
+
+    def next_deadline(self):
+        """下一次需要调用 tick() 的时刻；不显示时也按 CHECKPOINT_SEC 醒来刷新检查点，全部暂停时为 None。"""
+        d = self.timers.next_deadline()
+        if self.checkpoint is not None and self._saved_at is not None and self.timers.step is None and self.timers.running():
+            c = self._saved_at + CHECKPOINT_SEC
+            d = c if d is None else min(d, c)
+        return d
+
+    def tick(self, now=None):
+        """处理到点的计时器，返回事件列表；不到点时返回空列表。"""
+        events = []
+        for t in self.timers.pop_due(now):
+            if isinstance(t, CycleTimer):
+                events += [("phase", t, kind) for kind in self._advance(t) if not t.done()]
+            if t.done(): events.append(("finish", t, self.finish(t.id)))
+            else: events.append(("show", t, t.shown()))
+        if self._saved_at is not None and self.clock() - self._saved_at >= CHECKPOINT_SEC:
+            self.save_checkpoint()
+        return events
+
+    def finish(self, tid=None):
+        """结束计时器 tid（默认主计时器），把尚未记录的时间记到它绑定的任务；返回本次记录的秒数。"""
+        tid = self.main_tid if tid is None else tid
+        t = self.timers.remove(tid)
+        if t is None: return 0
+        if tid == self.main_tid: self.main_tid = None
+        if isinstance(t, CycleTimer): self._advance(t)
+        used = t.used(); self.record(used, t.task)
+        self.save_checkpoint()
+        return used
+
+    def _advance(self, t, end=None):
+        """番茄钟走完的阶段：专注阶段整段记入任务。返回新走完的阶段名列表。"""
+        now = self.wall() if end is None else end; kinds = []
+        for kind, sec, end_off in t.completed():
+            if kind == "work": self.record(sec, t.task, end=int(now - (t.elapsed() - end_off)))
+            kinds.append(kind)
+        return kinds
+
+    # ----- 记录 -----
+    def record(self, used_seconds, task, end=None):
+        """把 used_seconds 记到 task（结束于 end，默认现在）；task 为 None 或没有任何任务时不记录。"""
+        tasks = self.data.get("tasks")
+        if used_seconds <= 0 or task is None or not tasks: return None
+        # 记到计时器绑定的任务；任务已被删除时退回第一个任务
+        k = task if task in tasks else next(iter(tasks))
+        end = int(self.wall()) if end is None else int(end)
+        rec = session_record(k, end - used_seconds, used_seconds)
+        # 追加到会话日志（同时累加任务总时长），不重写整个数据文件
+        self.storage.append_session(self.data, rec)
+        if self.on_record is not None: self.on_record(rec)
+        return rec
+
+    # ----- 检查点 -----
+    def save_checkpoint(self):
+        if self.checkpoint is None: return
+        try: self.checkpoint.write(self.timers.timers, self.main_tid, self.wall())
+        except OSError as e: print(f"[Checkpoint] {e!r}", file=sys.stderr)
+        self._saved_at = self.clock()
+
+    def interrupted(self):
+        """上次退出时仍在运行的计时器状态列表（没有则为空）。"""
+        blob = self.checkpoint.read() if self.checkpoint is not None else None
+        return blob["timers"] if blob else []
+
+    def restore(self, states, resume=True):
+        """resume 为真时按检查点接着计时（返回重建的计时器），否则把已用时间记录下来；之后重写检查点。"""
+        out = []
+        for st in states:
+            t = Timer.from_state(st, self.clock)
+            if resume:
+                out.append(self.add(t, main=bool(st.get("main")) and self.main_tid is None))
+            else:
+                end = int(st["paused_at"] or st["saved"])
+                if isinstance(t, CycleTimer): self._advance(t, end)
+                self.record(t.used(), t.task, end=end)
+        self.save_checkpoint()
+        return out
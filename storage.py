@@ -0,0 +1,965 @@
+# -*- coding: utf-8 -*-
+"""
+FocusTimer 数据存储（不依赖 Tk）
+================================================================================
+设置/任务/会话的读写：JSON 分片 + 追加日志（可选 sqlite 后端）、列式会话存储、按天汇总，
+以及会话的导入/导出。图形界面和命令行共用这一份 load_data / DATA_FILE。
+"""
+from __future__ import annotations
+import os, sys, csv, io, json, copy, time, heapq, atexit, bisect, threading
+from array import array
+from datetime import datetime, timedelta, date
+import analytics
+
+try:
+    import sqlite3
+except Exception:
+    sqlite3 = None
+
+DATA_DIR = os.path.join(os.path.expanduser("~"), ".focustimer")
+os.makedirs(DATA_DIR, exist_ok=True)
+DATA_FILE = os.path.join(DATA_DIR, "data.json")
+DB_FILE   = os.path.join(DATA_DIR, "data.db")     # 存在即启用 sqlite 后端
+
+DEFAULT_DATA = {
+    # 窗口
+    "alpha": 0.98,
+    "always_on_top": False,
+
+    # 壁纸(主界面)
+    "wallpaper_main_file": None,    # 选单张
+    "wallpaper_main_dir": None,     # 选文件夹
+    "wallpaper_fit_pct": 92,        # 不铺满比例：图像显示为窗口较短边的 92%
+    "wallpaper_align": "center",    # 对齐：left/center/right + top/center/bottom（只做 center, top, bottom 简化）
+    "wallpaper_color_cache": {},    # 采样色缓存 {path:"#rrggbb"}
+
+    # 壁纸(仅时间)
+    "wallpaper_min_file": None,
+    "wallpaper_min_dir": None,
+    "wallpaper_min_fit_pct": 92,
+    "wallpaper_min_align": "center",
+
+    # 仅时间面板
+    "minimal_pos": None,            # [x,y]
+    "minimal_size": [560, 260],     # w,h
+    "minimal_font_base": 72,        # 基础字号，后续会根据窗口自适应
+    "minimal_show_future": True,
+    "minimal_show_notes": True,
+    "minimal_minutes": False,       # 主窗口最小化时仅时间窗只显示到分钟、每分钟刷新一次（省电）
+    "minimal_notes_memory": "",     # 在应用内的持久化草稿
+    "notes_save_path": None,        # 便签保存文件路径
+
+    # 提示音/音乐
+    "beep": True,
+    "suspend_policy": "count",      # 系统休眠期间计时器照常走(count)还是不计入(discard)
+    "sound_file": None,
+    "music_dir": None,
+    "music_shuffle": True,
+
+    # 番茄钟（分钟）：每 every 个专注后一次长休息，共 cycles 轮
+    "pomodoro": {"work": 25, "short": 5, "long": 15, "every": 4, "cycles": 1},
+
+    # 任务（合并版）
+    "tasks": {"高等数学": {"total": 0, "target": 25*60}, "数学建模": {"total": 0, "target": None}},
+    "sessions": [],
+    "rollups": {},                  # 按天汇总 {"YYYY-MM-DD": {"seconds", "count", "tasks": {任务: 秒}}}
+    "streaks": {},                  # 连续专注天数 {"*"|任务: {"last", "cur", "best"}}，随会话增量更新
+
+    # 未来
+    "future_events": [],
+    "future_unit": "混合",
+    "minimal_future_choice": "nearest",         # 月/天/小时/分钟/秒/混合
+    "time_color": "#000000",   # 时间字体颜色
+    "ui_tint_dynamic": True,   # 根据壁纸自动调整按钮/菜单颜色
+
+    "journal_seq": 0           # 已并入快照的会话日志序号
+}
+
+
+# --------- session store ---------
+def day_epoch(d: date) -> int:
+    """本地时区 d 当天 0 点的 epoch 秒。"""
+    return int(datetime(d.year, d.month, d.day).timestamp())
+
+def _iso_epoch(iso: str) -> int:
+    return int(datetime.fromisoformat(iso).timestamp())
+
+def iso_local(ts: int) -> str:
+    """epoch 秒 -> 本地时间 ISO 串；只在显示和导出时生成。"""
+    return datetime.fromtimestamp(ts).isoformat(timespec="seconds")
+
+def human_hms(sec: int) -> str:
+    h = sec // 3600; m = (sec % 3600) // 60; s = sec % 60
+    if h: return f"{h}小时{m}分{s}秒"
+    if m: return f"{m}分{s}秒"
+    return f"{s}秒"
+
+def session_record(task, start, seconds):
+    """会话记录：开始/结束均为整数 epoch 秒（旧版本存的是 start_iso/end_iso 字符串）。"""
+    return {"task": task, "seconds": int(seconds), "start": int(start), "end": int(start) + int(seconds)}
+
+def _epoch_record(rec):
+    return rec if "start" in rec else session_record(rec["task"], _iso_epoch(rec["start_iso"]), rec["seconds"])
+
+class SessionStore:
+    """会话的列式内存存储：开始时间(epoch 秒)、时长(秒)、任务 id 三列 array，任务名驻留在 task_names 中。
+    每条约 28 字节（三列 16 字节，加上下面结束时间索引的 12 字节）；
+    下标/切片/迭代返回 session_record 格式的 dict，调用方无需关心存储方式。
+
+    另维护一份按结束时间排序的索引（end_sorted + order），范围查询用 bisect 定位。
+    按时间顺序追加时直接接在末尾；导入的乱序记录先进 _pending，查询前再增量合并。"""
+    MERGE_INSORT_MAX = 64       # 待合并条数不多时逐条 insort，否则整体归并
+
+    def __init__(self, records=()):
+        self.start = array("q"); self.seconds = array("i"); self.task_id = array("I")
+        self.task_names = []; self._ids = {}
+        self.end_sorted = array("q"); self.order = array("I"); self._pending = []
+        for rec in records: self.append(rec)
+
+    @classmethod
+    def wrap(cls, v):
+        return v if isinstance(v, cls) else cls(v or ())
+
+    def _intern(self, name):
+        i = self._ids.get(name)
+        if i is None:
+            i = self._ids[name] = len(self.task_names); self.task_names.append(name)
+        return i
+
+    def add(self, task, start, seconds):
+        pos, end = len(self.start), int(start) + int(seconds)
+        self.start.append(int(start)); self.seconds.append(int(seconds)); self.task_id.append(self._intern(task))
+        if not self.end_sorted or end >= self.end_sorted[-1]:
+            self.end_sorted.append(end); self.order.append(pos)
+        else:
+            self._pending.append((end, pos))
+
+    def _merge(self):
+        if not self._pending: return
+        pending = sorted(self._pending); self._pending = []
+        ends, order = self.end_sorted, self.order
+        if len(pending) <= self.MERGE_INSORT_MAX:
+            for end, pos in pending:
+                i = bisect.bisect_right(ends, end); ends.insert(i, end); order.insert(i, pos)
+        else:
+            ends2, order2 = array("q"), array("I")
+            for end, pos in heapq.merge(zip(ends, order), pending):
+                ends2.append(end); order2.append(pos)
+            self.end_sorted, self.order = ends2, order2
+
+    def append(self, rec):
+        st = rec.get("start")
+        self.add(rec["task"], _iso_epoch(rec["start_iso"]) if st is None else st, rec["seconds"])
+
+    def clear(self):
+        self.__init__()
+
+    def copy(self):
+        c = SessionStore()
+        c.start, c.seconds, c.task_id = array("q", self.start), array("i", self.seconds), array("I", self.task_id)
+        c.task_names = list(self.task_names); c._ids = dict(self._ids)
+        c.end_sorted, c.order, c._pending = array("q", self.end_sorted), array("I", self.order), list(self._pending)
+        return c
+
+    def __len__(self): return len(self.start)
+
+    def record(self, i):
+        return session_record(self.task_names[self.task_id[i]], self.start[i], self.seconds[i])
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.record(j) for j in range(*i.indices(len(self)))]
+        return self.record(i)
+
+    def __iter__(self):
+        return (self.record(i) for i in range(len(self)))
+
+    def contains(self, task, start, seconds):
+        """是否已有这条会话（导入/inbox 判重）：在按结束时间排序的索引上二分，只比较结束时间相同的几条，
+        不为判重另建哈希集合（10 万条时要多占十几 MB）。"""
+        tid = self._ids.get(task)
+        if tid is None: return False
+        self._merge()
+        start = int(start); ends = self.end_sorted
+        i = bisect.bisect_left(ends, start + int(seconds))
+        while i < len(ends) and ends[i] == start + int(seconds):
+            j = self.order[i]
+            if self.start[j] == start and self.task_id[j] == tid: return True
+            i += 1
+        return False
+
+    def by_end(self, k):
+        """按结束时间排第 k 位（0 最早）的会话下标。"""
+        self._merge()
+        return self.order[k]
+
+    def indices(self, lo=None, hi=None, task=None):
+        """结束时间落在 [lo, hi) 内（epoch 秒，None 表示不限）且属于 task 的会话下标，按结束时间排序。
+        这是按时间范围查询会话的入口：store.record(i) 取记录，导出/统计都从这里取下标。"""
+        self._merge()
+        a = 0 if lo is None else bisect.bisect_left(self.end_sorted, lo)
+        b = len(self.order) if hi is None else bisect.bisect_left(self.end_sorted, hi)
+        if task is None: return self.order[a:b]
+        tid = self._ids.get(task, -1); tk_ = self.task_id
+        return [i for i in self.order[a:b] if tk_[i] == tid]
+
+    def totals(self, lo=None, hi=None):
+        """{任务: 秒数}，只统计结束时间落在 [lo, hi) 内的会话。"""
+        acc = [0] * len(self.task_names)
+        sec, tk_ = self.seconds, self.task_id
+        for i in self.indices(lo, hi): acc[tk_[i]] += sec[i]
+        return {self.task_names[t]: n for t, n in enumerate(acc) if n}
+
+def _json_default(o):
+    if isinstance(o, SessionStore): return list(o)
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+# --------- data io ---------
+# 分片存储：设置/缓存/会话/未来事件/便签各存一个 JSON 文件，保存时只重写被改动的分片。
+# 会话另有追加日志 sessions.jsonl，其余带键修改追加到 wal.jsonl；两者共用递增 seq，
+# 分片文件记下写入时的 seq，启动时只重放比对应分片更新的日志行。
+# 分片整体写入走“临时文件 + fsync + rename”，不会留下半个文件。
+SHARD_FILES = {name: os.path.join(DATA_DIR, f"{name}.json")
+               for name in ("settings", "caches", "sessions", "events", "notes")}
+SHARD_KEYS = {"caches": ("wallpaper_color_cache", "rollups", "streaks"), "sessions": ("sessions",),
+              "events": ("future_events",), "notes": ("minimal_notes_memory",)}   # 其余键归 settings
+_KEY_SHARD = {k: name for name, ks in SHARD_KEYS.items() for k in ks}
+META_KEYS = ("journal_seq",)    # 只在内存里使用，不落入任何分片
+SESSIONS_JOURNAL = os.path.join(DATA_DIR, "sessions.jsonl")
+WAL_FILE = os.path.join(DATA_DIR, "wal.jsonl")
+JOURNAL_COMPACT_LINES = 200     # 会话日志超过该条数则把它合并进 sessions 分片
+SAVE_QUIET_SEC = 0.8            # 写盘静默期：滚轮/拖动等连续修改合并成一次写入
+SAVE_RETRY_SEC = 5.0            # 写盘失败（磁盘满、文件被占用）后隔多久重试
+WAL_FLUSH_SEC = 0.2             # 带键修改在内存里按键合并，最多攒这么久再追加进 WAL
+_JOURNAL_LOCK = threading.Lock()
+# 落盘进度（受 _JOURNAL_LOCK 保护）：各分片文件的 seq、WAL 中各分片最新的 seq、会话日志情况
+_DISK = {"shard_seq": {}, "wal_seq": {}, "session_seq": 0, "session_lines": 0}
+_SESSION_SHARDS = ("sessions", "settings", "caches")     # 一条会话会改动的分片：记录本身、任务总时长、按天汇总
+
+def shard_of(key):
+    return _KEY_SHARD.get(key, "settings")
+
+def _shard_items(data, name):
+    if name == "settings":
+        return {k: v for k, v in data.items() if k not in _KEY_SHARD and k not in META_KEYS}
+    return {k: data[k] for k in SHARD_KEYS[name] if k in data}
+
+def _read_json(path, quarantine=True):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            blob = json.load(f)
+        return blob if isinstance(blob, dict) else None
+    except FileNotFoundError:
+        return None
+    except Exception:
+        # 文件损坏：挪到一边保留现场，而不是直接用默认值覆盖（只读加载时不动文件）
+        if quarantine:
+            try: os.replace(path, f"{path}.broken-{int(time.time())}")
+            except OSError: pass
+        return None
+
+def _read_shards(readonly=False):
+    """返回 (data, 各分片 seq, 需要重写的分片, 是否来自旧版 data.json)；没有任何数据时 data 为 None。
+    一个分片都没有时才算新安装或旧版迁移；否则只有读不出来（缺失或损坏）的分片需要重写，
+    已有的分片绝不拿默认值覆盖。"""
+    if not any(os.path.exists(p) for p in SHARD_FILES.values()):
+        legacy = _read_json(DATA_FILE, not readonly)    # 旧版单文件 data.json：整体迁移成分片
+        if legacy is None: return None, dict.fromkeys(SHARD_FILES, 0), set(SHARD_FILES), False
+        return legacy, dict.fromkeys(SHARD_FILES, int(legacy.pop("journal_seq", 0))), set(SHARD_FILES), True
+    data, seqs, bad = {}, {}, set()
+    for name, path in SHARD_FILES.items():
+        blob = _read_json(path, not readonly)
+        if blob is None: bad.add(name); blob = {}
+        seqs[name] = int(blob.get("seq", 0)); data.update(blob.get("data", {}))
+    return data, seqs, bad, False
+
+def load_data(readonly=False):
+    """读入全部数据。readonly 为真时（命令行与界面同时运行）不改动任何文件：损坏的分片不挪走，
+    sqlite 库只读打开、不启用后端（统计走内存里的会话列），inbox 里尚未并入的会话只叠加到返回的内存数据上；
+    否则顺带把 inbox 并入。"""
+    if sqlite3 is not None and os.path.exists(DB_FILE):
+        data = _load_db_data(readonly); drain_inbox(data, readonly)
+        return data
+    data, seqs, bad, legacy = _read_shards(readonly)
+    fresh = data is None
+    if fresh: data = copy.deepcopy(DEFAULT_DATA)
+    need_rollups = "rollups" not in data or "streaks" not in data
+    # 兼容 tasks int -> dict
+    if isinstance(data.get("tasks"), dict):
+        for k,v in list(data["tasks"].items()):
+            if isinstance(v, int):
+                data["tasks"][k] = {"total": v, "target": None}
+    for k,v in DEFAULT_DATA.items():
+        if k not in data: data[k] = copy.deepcopy(v)
+    raw = data["sessions"]
+    iso_records = isinstance(raw, list) and bool(raw) and "start" not in raw[0]
+    data["sessions"] = SessionStore.wrap(raw)
+    with _JOURNAL_LOCK:
+        _DISK["shard_seq"] = dict(seqs)
+    _replay_journals(data, seqs)
+    if "settings" in bad and not (fresh or legacy):
+        rebuild_task_totals(data)   # settings 分片丢了：任务总时长只能从会话记录重算
+    if need_rollups:
+        rebuild_rollups(data)   # 旧数据首次启动：从原始会话生成一次
+    if readonly:
+        drain_inbox(data, True)
+        return data
+    if bad:
+        _write_shards(data, bad)    # 只重写缺失/损坏的分片，损坏的原文件已挪到 .broken-* 保留
+        if legacy: os.replace(DATA_FILE, f"{DATA_FILE}.migrated")
+    if need_rollups and "caches" not in bad:
+        _SAVER.schedule(data, ("caches",))
+    if iso_records and "sessions" not in bad:
+        _SAVER.schedule(data, ("sessions",))    # 一次性迁移：后台把 ISO 字符串记录改写成整数 epoch
+    if _DISK["session_lines"] >= JOURNAL_COMPACT_LINES:
+        _SAVER.schedule(data, _SESSION_SHARDS)
+    drain_inbox(data)
+    return data
+
+def save_data(data, *keys):
+    """登记一次保存：由后台线程在静默期后只重写 keys 所在的分片，不阻塞 Tk 主循环。
+    新值由后台线程追加进 WAL（同一键在 WAL_FLUSH_SEC 内只写最后一次），进程在静默期内被杀也能恢复；
+    代价是被杀前最后不到 WAL_FLUSH_SEC 的修改会丢。不给 keys 时重写全部分片。"""
+    if _DB is not None:
+        _SAVER.schedule_db(data, keys); return      # sqlite 每次提交本身就是原子的，不需要 WAL
+    if not keys:
+        _SAVER.schedule(data, SHARD_FILES); return
+    with _JOURNAL_LOCK:
+        _next_seq(data)
+    _SAVER.schedule(data, {shard_of(k) for k in keys}, wal_keys=keys)
+
+def flush_data():
+    """立即写出尚未落盘的修改（退出前调用）。"""
+    _SAVER.flush()
+
+def _atomic_write(path, text):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text); f.flush(); os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if os.name != "nt":
+        # rename 本身也要落盘，否则断电后可能回到旧目录项
+        try:
+            fd = os.open(os.path.dirname(path), os.O_RDONLY)
+            try: os.fsync(fd)
+            finally: os.close(fd)
+        except OSError:
+            pass
+
+def _snapshot_shards(data, shards):
+    """{分片: {"seq", "data"}}：在调用方线程、日志锁内取快照，分片内容与 seq 对应同一时刻
+    （会话列只追加，复制 array 即可；其余深拷贝，之后 Tk 线程再改 data 也不影响写出的内容）。"""
+    with _JOURNAL_LOCK:
+        seq = data.get("journal_seq", 0)
+        return {name: {"seq": seq, "data": {k: (v.copy() if k == "sessions" else copy.deepcopy(v))
+                                            for k, v in _shard_items(data, name).items()}}
+                for name in shards}
+
+def _write_shards(data, shards):
+    with _SAVER._io_lock:       # 与后台写入串行：快照按取得的先后落盘
+        _write_blobs(_snapshot_shards(data, shards))
+
+def _write_blobs(blobs):
+    """写出分片快照（调用方持有 _SAVER._io_lock）。比磁盘上已有内容更旧的快照直接丢弃，
+    绝不拿旧快照覆盖新分片——日志可能已经按新分片的 seq 清空了。"""
+    with _JOURNAL_LOCK:
+        disk = _DISK["shard_seq"]
+        blobs = {name: blob for name, blob in blobs.items() if blob["seq"] >= disk.get(name, 0)}
+    for name, blob in blobs.items():
+        _atomic_write(SHARD_FILES[name], json.dumps(blob, ensure_ascii=False, default=_json_default,
+                                                    indent=None if name == "sessions" else 2))
+    with _JOURNAL_LOCK:
+        disk = _DISK["shard_seq"]
+        for name, blob in blobs.items(): disk[name] = blob["seq"]
+        # 日志里的每一行都已落入对应分片时才能清空（会话行同时影响 _SESSION_SHARDS 中的三个分片）
+        if _DISK["session_seq"] <= min(disk.get(name, 0) for name in _SESSION_SHARDS):
+            _truncate(SESSIONS_JOURNAL); _DISK["session_lines"] = 0
+        if all(v <= disk.get(name, 0) for name, v in _DISK["wal_seq"].items()):
+            _truncate(WAL_FILE); _DISK["wal_seq"].clear()
+
+def _truncate(path):
+    if os.path.exists(path): open(path, "w").close()
+
+def _append_line(path, rec, sync=False):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(rec, ensure_ascii=False, default=_json_default) + "\n")
+        if sync: f.flush(); os.fsync(f.fileno())
+
+def _next_seq(data):
+    data["journal_seq"] = seq = int(data.get("journal_seq", 0)) + 1
+    return seq
+
+class _SaveWorker:
+    """后台写盘线程：schedule 在调用方线程上取脏分片的快照，连续调用每个分片只留最新一份，
+    最后一次调用 quiet 秒后写一次。写失败时快照放回队列，SAVE_RETRY_SEC 秒后重试，并打印到 stderr。
+    wal_keys 的新值同时排进 WAL 队列：按键合并，自第一条起 WAL_FLUSH_SEC 后一次追加，不等静默期。
+    sqlite 后端时改用 schedule_db：按键取值快照，同样合并后在静默期后一个事务写入。"""
+    def __init__(self, quiet=SAVE_QUIET_SEC):
+        self.quiet = quiet
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()    # 后台写入与 flush 串行
+        self._pending = {}; self._due = 0.0; self._thr = None
+        self._wal = {}; self._wal_due = 0.0     # 键 -> (seq, 分片, 值)
+        self._db = {}                           # sqlite 后端：键 -> 值快照
+
+    def schedule(self, data, shards, wal_keys=()):
+        blobs = _snapshot_shards(data, shards)
+        with self._cond:
+            if wal_keys and not self._wal: self._wal_due = time.monotonic() + WAL_FLUSH_SEC
+            for k in wal_keys:
+                name = shard_of(k); blob = blobs[name]
+                self._wal[k] = (blob["seq"], name, blob["data"].get(k))    # 与分片快照共用同一份副本
+            self._pending.update(blobs); self._wake()
+
+    def schedule_db(self, data, keys=()):
+        keys = [k for k in (keys or [k for k in data if k != "sessions"]) if k not in _DB_SKIP]
+        vals = {k: (data[k].copy() if k == "sessions" else copy.deepcopy(data.get(k))) for k in keys}
+        with self._cond:
+            self._db.update(vals); self._wake()
+
+    def _wake(self):
+        self._due = time.monotonic() + self.quiet
+        if self._thr is None:
+            self._thr = threading.Thread(target=self._run, name="focustimer-save", daemon=True)
+            self._thr.start()
+        self._cond.notify()
+
+    def flush(self):
+        # 先拿 _io_lock 再取快照：与 _run 一样保证"先取的先写"，正在进行的写入也会先完成
+        with self._io_lock:
+            with self._cond:
+                wal, self._wal = self._wal, {}
+                blobs, db = self._take()
+            if wal: self._write_wal(wal)
+            if blobs or db: self._write(blobs, db)
+
+    def _take(self):
+        blobs, db = self._pending, self._db
+        self._pending = {}; self._db = {}
+        return blobs, db
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._pending or self._db or self._wal): self._cond.wait()
+                now = time.monotonic()
+                due = [d for d, q in ((self._wal_due, self._wal), (self._due, self._pending or self._db)) if q]
+                if min(due) > now:
+                    self._cond.wait(min(due) - now); continue
+            with self._io_lock:
+                # 拿到 _io_lock 之后才取：期间 flush 可能已取走并写出了更新的快照
+                with self._cond:
+                    now = time.monotonic(); wal = taken = None
+                    if self._wal and now >= self._wal_due: wal, self._wal = self._wal, {}
+                    if (self._pending or self._db) and now >= self._due: taken = self._take()
+                if wal: self._write_wal(wal)
+                if taken: self._write(*taken)
+
+    def _write_wal(self, wal):
+        """把合并后的键值追加进 WAL：同一次 save_data 的键共用一行；对应分片已经写出更新内容的跳过。"""
+        lines = {}
+        for k, (seq, name, v) in wal.items(): lines.setdefault(seq, {})[k] = v
+        try:
+            with _JOURNAL_LOCK:
+                disk = _DISK["shard_seq"]; out = []
+                for seq in sorted(lines):
+                    ks = {k: v for k, v in lines[seq].items() if seq > disk.get(shard_of(k), 0)}
+                    if ks: out.append(json.dumps({"seq": seq, "set": ks}, ensure_ascii=False, default=_json_default) + "\n")
+                if not out: return
+                with open(WAL_FILE, "a", encoding="utf-8") as f: f.write("".join(out))
+                for seq in lines:
+                    for k in lines[seq]:
+                        name = shard_of(k)
+                        if seq > disk.get(name, 0): _DISK["wal_seq"][name] = max(_DISK["wal_seq"].get(name, 0), seq)
+        except OSError as e:
+            print(f"[Save] {e!r}", file=sys.stderr)     # 分片写入仍会按计划进行
+
+    def _write(self, blobs, db=None):
+        """调用方持有 _io_lock。"""
+        try:
+            if db and _DB is not None: _DB.save(db, tuple(db))
+            if blobs: _write_blobs(blobs)
+            return True
+        except Exception as e:
+            print(f"[Save] {e!r}", file=sys.stderr)
+        with self._cond:
+            # 放回队列；等待期间同一分片/键又有了更新的快照时以新的为准
+            for name, blob in blobs.items(): self._pending.setdefault(name, blob)
+            for k, v in (db or {}).items(): self._db.setdefault(k, v)
+            self._due = max(self._due, time.monotonic() + SAVE_RETRY_SEC); self._cond.notify()
+        return False
+
+_SAVER = _SaveWorker()
+atexit.register(flush_data)
+
+def _apply_session(data, rec, sessions=True, totals=True, rollup=True):
+    if sessions: data.setdefault("sessions", SessionStore()).append(rec)
+    if totals:
+        t = data.setdefault("tasks", {}).setdefault(rec["task"], {"total": 0, "target": None})
+        t["total"] = int(t.get("total", 0)) + int(rec["seconds"])
+    if rollup:
+        day = datetime.fromtimestamp(rec["end"]).date().isoformat()
+        _add_rollup(data.setdefault("rollups", {}), day, rec["task"], int(rec["seconds"]))
+        _bump_streaks(data, day, rec["task"])
+
+def _add_rollup(roll, day, task, seconds):
+    r = roll.get(day)
+    if r is None: r = roll[day] = {"seconds": 0, "count": 0, "tasks": {}}
+    r["seconds"] += seconds; r["count"] += 1
+    r["tasks"][task] = r["tasks"].get(task, 0) + seconds
+
+def _bump_streaks(data, day, task):
+    streaks = data.setdefault("streaks", {})
+    if not (analytics.bump_streak(streaks, analytics.ALL, day) and analytics.bump_streak(streaks, task, day)):
+        data["streaks"] = analytics.rebuild_streaks(data["rollups"])   # 补录了更早的日期，整体重算
+
+def rebuild_rollups(data):
+    """从原始会话重新生成按天汇总与连续天数（升级后首次启动、或汇总与记录对不上时手动执行）。"""
+    roll = {}; store = data["sessions"]; names = store.task_names
+    for st, n, tid in zip(store.start, store.seconds, store.task_id):
+        _add_rollup(roll, datetime.fromtimestamp(st + n).date().isoformat(), names[tid], n)
+    data["rollups"] = roll
+    data["streaks"] = analytics.rebuild_streaks(roll)
+    return roll
+
+def rebuild_task_totals(data):
+    """按会话记录重算每个任务的累计时长（没有会话的任务归零）。"""
+    totals = data["sessions"].totals(); tasks = data.setdefault("tasks", {})
+    for name, info in tasks.items(): info["total"] = totals.get(name, 0)
+    for name, n in totals.items(): tasks.setdefault(name, {"total": n, "target": None})
+
+def focus_metrics(data, today):
+    """连续天数、近 7/30 天日均、近 30 天稳定度与目标达成情况；只查按天汇总，与会话总数无关。"""
+    roll, streaks = data.get("rollups") or {}, data.get("streaks") or {}
+    st = streaks.get(analytics.ALL) or {}
+    _, done, with_target = analytics.goal_progress(data.get("tasks", {}))
+    return {"streak": analytics.current_streak(streaks, analytics.ALL, today), "best": st.get("best", 0),
+            "avg7": analytics.rolling_avg(roll, today, 7), "avg30": analytics.rolling_avg(roll, today, 30),
+            "consistency": analytics.consistency(roll, today, 30), "goals_done": done, "goals": with_target}
+
+def _read_journal(path):
+    out = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for ln in f:
+                try:
+                    rec = json.loads(ln); rec["seq"] = int(rec["seq"])
+                except Exception:
+                    continue    # 进程被杀时可能留下半行
+                out.append(rec)
+    except FileNotFoundError:
+        pass
+    return out
+
+def _replay_journals(data, seqs):
+    """按 seq 顺序把两份日志中比对应分片更新的行重放进 data。"""
+    top = max(seqs.values(), default=0); session_seq = lines = 0
+    wal_seq = {}
+    for rec in sorted(_read_journal(SESSIONS_JOURNAL) + _read_journal(WAL_FILE), key=lambda r: r["seq"]):
+        seq = rec.pop("seq"); top = max(top, seq)
+        if "set" in rec:
+            for k, v in rec["set"].items():
+                name = shard_of(k); wal_seq[name] = seq
+                if seq > seqs.get(name, 0): data[k] = SessionStore.wrap(v) if k == "sessions" else v
+        else:
+            session_seq = seq; lines += 1
+            _apply_session(data, _epoch_record(rec), sessions=seq > seqs.get("sessions", 0), totals=seq > seqs.get("settings", 0),
+                           rollup=seq > seqs.get("caches", 0))
+    data["journal_seq"] = top
+    with _JOURNAL_LOCK:
+        _DISK.update(wal_seq=wal_seq, session_seq=session_seq, session_lines=lines)
+
+def append_session(data, rec):
+    """记录一条会话：只向会话日志追加一行（O(1) I/O），并累加到对应任务。"""
+    if _DB is not None:
+        _DB.append_session(rec); _apply_session(data, rec)
+        _SAVER.schedule_db(data, ("tasks",))    # 排队中的旧 tasks 快照写出时不能盖掉这次累加
+        return
+    with _JOURNAL_LOCK:
+        seq = _next_seq(data)
+        _append_line(SESSIONS_JOURNAL, dict(rec, seq=seq), sync=True)
+        _apply_session(data, rec)
+        _DISK["session_seq"] = seq; _DISK["session_lines"] += 1
+        compact = _DISK["session_lines"] >= JOURNAL_COMPACT_LINES
+    if compact:
+        _SAVER.schedule(data, _SESSION_SHARDS)
+
+def stats_summary(data, today):
+    """(今日秒数, 本周秒数, 本月秒数, 今日次数)：按天汇总查表，代价只与区间天数有关；
+    sqlite 后端走 end_ts 索引。"""
+    start_week = today - timedelta(days=today.weekday()); start_month = today.replace(day=1)
+    if _DB is not None:
+        return _DB.summary(today, start_week, start_month)
+    roll = data.get("rollups") or {}
+    weekly = monthly = 0
+    d = min(start_week, start_month)
+    while d <= today:
+        r = roll.get(d.isoformat())
+        if r:
+            if d >= start_week: weekly += r["seconds"]
+            if d >= start_month: monthly += r["seconds"]
+        d += timedelta(days=1)
+    r = roll.get(today.isoformat()) or {"seconds": 0, "count": 0}
+    return r["seconds"], weekly, monthly, r["count"]
+
+# --------- inbox ---------
+# 不拥有数据文件的进程（命令行）不碰分片和日志：每条会话原子地写成 inbox 下的一个小文件，
+# 由界面进程（或下一次非只读的 load_data）按 (任务, 开始, 时长) 去重后并入，并入后删除。
+INBOX_DIR = os.path.join(DATA_DIR, "inbox")
+
+def post_session(rec):
+    os.makedirs(INBOX_DIR, exist_ok=True)
+    name = f"{rec['end']}-{os.getpid()}-{time.monotonic_ns()}.json"
+    _atomic_write(os.path.join(INBOX_DIR, name), json.dumps(rec, ensure_ascii=False))
+
+def _read_inbox():
+    """[(路径, 会话记录)]，按文件名（结束时刻）排序；写到一半的 .tmp 与损坏文件跳过。"""
+    try:
+        names = sorted(n for n in os.listdir(INBOX_DIR) if n.endswith(".json"))
+    except FileNotFoundError:
+        return []
+    out = []
+    for n in names:
+        path = os.path.join(INBOX_DIR, n)
+        try:
+            with open(path, "r", encoding="utf-8") as f: rec = _epoch_record(json.load(f))
+            int(rec["seconds"]); str(rec["task"])
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+        out.append((path, rec))
+    return out
+
+def drain_inbox(data, readonly=False):
+    """把 inbox 中的新会话并入 data，返回条数。readonly 时只叠加到内存、不删文件、不写日志。"""
+    items = _read_inbox()
+    if not items: return 0
+    store = data["sessions"]; n = 0
+    for path, rec in items:
+        if not store.contains(rec["task"], rec["start"], rec["seconds"]):
+            if readonly: _apply_session(data, rec)
+            else: append_session(data, rec)
+            n += 1
+        if not readonly:
+            try: os.remove(path)
+            except OSError: pass
+    return n
+
+# --------- import ---------
+IMPORT_READ_CHUNK = 1 << 16
+
+def _import_row(rec):
+    """导出记录 -> (任务, 开始 epoch, 时长)；字段缺失或非法时抛 ValueError/KeyError。"""
+    task = str(rec.get("task") or "").strip(); sec = int(float(rec.get("seconds") or 0))
+    st = rec.get("start")
+    st = int(float(st)) if st not in (None, "") else _iso_epoch(rec["start_iso"])
+    if not task or sec <= 0: raise ValueError("empty session")
+    return task, st, sec
+
+def _iter_json_sessions(f):
+    """逐个解析 {"sessions": [...], ...} 中的会话对象，不把整个文件读进内存。
+    sessions 不在最前面的文件（非本程序导出）退回整体 json.load。"""
+    dec = json.JSONDecoder(); buf = f.read(IMPORT_READ_CHUNK)
+    head = buf.lstrip()
+    if not (head.startswith("{") and head[1:].lstrip().startswith('"sessions"')):
+        blob = json.loads(buf + f.read())
+        yield from (blob.get("sessions", []) if isinstance(blob, dict) else blob)
+        return
+    pos = buf.index("[") + 1
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,": pos += 1
+            if pos < len(buf): break
+            more = f.read(IMPORT_READ_CHUNK)
+            if not more: return
+            buf, pos = more, 0
+        if buf[pos] == "]": return
+        try:
+            obj, pos = dec.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            more = f.read(IMPORT_READ_CHUNK)
+            if not more: raise
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield obj
+
+def iter_import_records(f, fmt):
+    if fmt == "CSV": return csv.DictReader(f)
+    if fmt == "JSONL": return (json.loads(ln) for ln in f if ln.strip())
+    return _iter_json_sessions(f)
+
+def scan_import(path, known, progress=None, cancel=None):
+    """流式读取导出文件（按扩展名判断 JSON/JSONL/CSV），返回 (新会话 [(任务, 开始, 时长)], 重复数, 无效数)。
+    known 为已有会话的 SessionStore 副本（copy()），按索引二分判重；文件内部的重复用只含新会话的临时集合跳过。
+    可在后台线程调用。"""
+    ext = os.path.splitext(path)[1].lower()
+    fmt = {v: k for k, v in EXPORT_FORMATS.items()}.get(ext, "JSON")
+    size = max(1, os.path.getsize(path)); rows = []; seen = set(); dup = bad = 0
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for n, rec in enumerate(iter_import_records(f, fmt)):
+            if n % 5000 == 0:       # 放在 continue 之前：全是重复/无效行的文件也要能看到进度、能取消
+                if cancel is not None and cancel.is_set(): raise InterruptedError("导入已取消")
+                if progress: progress(min(size, f.buffer.tell() if hasattr(f, "buffer") else 0), size)
+            try:
+                key = _import_row(rec)
+            except Exception:
+                bad += 1; continue
+            if key in seen or known.contains(*key): dup += 1; continue
+            seen.add(key); rows.append(key)
+    return rows, dup, bad
+
+def merge_sessions(data, rows):
+    """把 scan_import 得到的新会话并入 data（Tk 线程调用）：累加任务总时长与按天汇总，乱序记录由索引增量归并。
+    再次对照当前记录判重，扫描期间新完成的会话不会被重复计入。返回实际新增条数。"""
+    store = data["sessions"]
+    tasks = data.setdefault("tasks", {}); roll = data.setdefault("rollups", {})
+    added = [r for r in rows if not store.contains(*r)]     # 先全部判重再追加：判重时索引只归并一次
+    for task, st, sec in added:
+        store.add(task, st, sec)
+        t = tasks.setdefault(task, {"total": 0, "target": None}); t["total"] = int(t.get("total", 0)) + sec
+        _add_rollup(roll, datetime.fromtimestamp(st + sec).date().isoformat(), task, sec)
+    if not added: return 0
+    data["streaks"] = analytics.rebuild_streaks(roll)
+    if _DB is not None:
+        _DB.import_sessions(added); _SAVER.schedule_db(data, ("tasks",))
+    else:
+        _SAVER.schedule(data, _SESSION_SHARDS)     # 批量导入不逐条写日志，直接重写相关分片
+    return len(added)
+
+def task_totals(data, since=None, until=None):
+    """{任务: 秒数}，只统计 end 落在 [since, until) 内的会话（date，可为 None）。"""
+    if _DB is not None:
+        return _DB.task_totals(since, until)
+    return data["sessions"].totals(day_epoch(since) if since else None, day_epoch(until) if until else None)
+
+# --------- export ---------
+EXPORT_FORMATS = {"JSON": ".json", "JSONL": ".jsonl", "CSV": ".csv"}
+EXPORT_CHUNK = 1000     # 每攒够这么多条写一次
+EXPORT_FIELDS = ("task", "seconds", "start_iso", "end_iso")
+
+def _export_row(store, i):
+    st = store.start[i]; n = store.seconds[i]
+    return {"task": store.task_names[store.task_id[i]], "seconds": n, "start_iso": iso_local(st), "end_iso": iso_local(st + n)}
+
+def iter_export_chunks(store, idx, fmt, extra=None):
+    """按块生成 (文本, 本块会话数)：store 中下标为 idx 的会话，fmt 为 JSON/JSONL/CSV。
+    JSON 保持旧的 {"sessions": [...], "tasks": ..., "future_events": ...} 结构，extra 为其余键。"""
+    if fmt == "JSON": yield '{"sessions": [\n', 0
+    elif fmt == "CSV": yield ",".join(EXPORT_FIELDS) + "\n", 0
+    buf = io.StringIO(); w = csv.writer(buf, lineterminator="\n")
+    for a in range(0, len(idx), EXPORT_CHUNK):
+        recs = [_export_row(store, i) for i in idx[a:a + EXPORT_CHUNK]]
+        if fmt == "CSV":
+            buf.seek(0); buf.truncate()
+            w.writerows([r[k] for k in EXPORT_FIELDS] for r in recs)
+            chunk = buf.getvalue()
+        elif fmt == "JSONL":
+            chunk = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in recs)
+        else:
+            chunk = (",\n" if a else "") + ",\n".join(json.dumps(r, ensure_ascii=False) for r in recs)
+        yield chunk, len(recs)
+    if fmt == "JSON":
+        tail = "".join(f",\n{json.dumps(k)}: {json.dumps(v, ensure_ascii=False)}" for k, v in (extra or {}).items())
+        yield "\n]" + tail + "}\n", 0
+
+def _to_epoch(x):
+    if x is None or isinstance(x, (int, float)): return x
+    if isinstance(x, datetime): return int(x.timestamp())
+    if isinstance(x, date): return day_epoch(x)
+    return _iso_epoch(x)
+
+def prepare_export(data, since=None, until=None, task=None):
+    """在 Tk 线程上取导出快照 (store, idx, extra)：会话存储本身、其中结束时间落在 [since, until) 内的下标、
+    tasks/future_events 副本。since/until 可为 epoch 秒、date（当天 0 点）、datetime 或 ISO 字符串，None 表示不限。
+    后台线程只用这里返回的 store，不再去读 data["sessions"]（它可能已被换成别的对象）。"""
+    store = data["sessions"]
+    idx = store.indices(_to_epoch(since), _to_epoch(until), task)
+    extra = {"tasks": copy.deepcopy(data.get("tasks", {})), "future_events": copy.deepcopy(data.get("future_events", []))}
+    return store, idx, extra
+
+def export_sessions(store, idx, extra, path, fmt="JSON", progress=None, cancel=None):
+    """把 prepare_export 取好的快照流式写到 path（先写 .part 再改名），供后台线程调用。
+    progress(done, total) 每块回调一次；cancel 为 threading.Event，置位后中止并删除半成品。"""
+    tmp = f"{path}.part"; done = 0
+    try:
+        with open(tmp, "w", encoding="utf-8", newline="") as f:
+            for chunk, n in iter_export_chunks(store, idx, fmt, extra):
+                if cancel is not None and cancel.is_set(): raise InterruptedError("导出已取消")
+                f.write(chunk)
+                if n:
+                    done += n
+                    if progress: progress(done, len(idx))
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    return done
+
+# --------- sqlite backend ---------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS tasks (name TEXT PRIMARY KEY, total INTEGER NOT NULL DEFAULT 0, target INTEGER, pos INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS future_events (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, date TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, task TEXT NOT NULL,
+    seconds INTEGER NOT NULL, start_ts INTEGER NOT NULL, end_ts INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_sessions_end ON sessions(end_ts);
+CREATE INDEX IF NOT EXISTS idx_sessions_task ON sessions(task, end_ts);
+"""
+# 旧库的会话表存 ISO 字符串：整表换成 epoch 列（'utc' 修饰符把本地时间换算成 UTC）
+_MIGRATE_EPOCH = """
+DROP INDEX IF EXISTS idx_sessions_end; DROP INDEX IF EXISTS idx_sessions_task;
+ALTER TABLE sessions RENAME TO sessions_iso;
+CREATE TABLE sessions (id INTEGER PRIMARY KEY AUTOINCREMENT, task TEXT NOT NULL,
+    seconds INTEGER NOT NULL, start_ts INTEGER NOT NULL, end_ts INTEGER NOT NULL);
+INSERT INTO sessions(id, task, seconds, start_ts, end_ts)
+    SELECT id, task, seconds, CAST(strftime('%s', start_iso, 'utc') AS INTEGER),
+           CAST(strftime('%s', end_iso, 'utc') AS INTEGER) FROM sessions_iso;
+DROP TABLE sessions_iso;
+"""
+
+_DB_SKIP = ("rollups", "streaks") + META_KEYS     # 只在内存里维护，不写进数据库
+
+class SqliteStore:
+    """可选的 sqlite3 后端：设置/任务/未来事件/会话分表保存，会话按 end_ts（epoch 秒）与 task 建索引，
+    日期范围求和直接走索引。"""
+    def __init__(self, path=DB_FILE, readonly=False):
+        self.path = path
+        self._lock = threading.Lock()     # 统计线程等也可能查询
+        if readonly:
+            # 只读打开（命令行与界面同时运行）：不建表、不迁移、不改日志模式，旧表结构在查询时换算
+            import pathlib
+            uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+        cols = {r[1] for r in self.conn.execute("PRAGMA table_info(sessions)")}
+        self.iso_schema = "start_iso" in cols
+        if readonly: return
+        self.conn.execute("PRAGMA journal_mode=WAL"); self.conn.execute("PRAGMA synchronous=NORMAL")
+        if self.iso_schema:
+            self.conn.executescript("BEGIN;" + _MIGRATE_EPOCH + "COMMIT;")
+        self.conn.executescript(_SCHEMA); self.iso_schema = False
+
+    def close(self):
+        with self._lock: self.conn.close()
+
+    def load(self):
+        with self._lock:
+            c = self.conn
+            data = {k: json.loads(v) for k, v in c.execute("SELECT key, value FROM settings")}
+            data["tasks"] = {n: {"total": t, "target": g} for n, t, g in
+                             c.execute("SELECT name, total, target FROM tasks ORDER BY pos")}
+            data["future_events"] = [{"title": t, "date": d} for t, d in
+                                     c.execute("SELECT title, date FROM future_events ORDER BY id")]
+            store = data["sessions"] = SessionStore()
+            start = "CAST(strftime('%s', start_iso, 'utc') AS INTEGER)" if self.iso_schema else "start_ts"
+            for t, n, st in c.execute(f"SELECT task, seconds, {start} FROM sessions ORDER BY id"):
+                store.add(t, st, n)
+        return data
+
+    def save(self, data, keys=()):
+        keys = keys or [k for k in data if k != "sessions"]
+        with self._lock, self.conn as c:      # 一次调用一个事务
+            for k in keys:
+                if k in _DB_SKIP:
+                    continue
+                elif k == "tasks":
+                    c.execute("DELETE FROM tasks")
+                    c.executemany("INSERT INTO tasks(name, total, target, pos) VALUES (?,?,?,?)",
+                                  [(n, int(v.get("total", 0)), v.get("target"), i)
+                                   for i, (n, v) in enumerate(data.get("tasks", {}).items())])
+                elif k == "future_events":
+                    c.execute("DELETE FROM future_events")
+                    c.executemany("INSERT INTO future_events(title, date) VALUES (?,?)",
+                                  [(ev["title"], ev["date"]) for ev in data.get("future_events", [])])
+                elif k == "sessions":
+                    c.execute("DELETE FROM sessions")
+                    self._insert_sessions(c, data.get("sessions", []))
+                else:
+                    c.execute("INSERT OR REPLACE INTO settings(key, value) VALUES (?,?)",
+                              (k, json.dumps(data.get(k), ensure_ascii=False, default=_json_default)))
+
+    def _insert_sessions(self, c, sessions):
+        c.executemany("INSERT INTO sessions(task, seconds, start_ts, end_ts) VALUES (?,?,?,?)",
+                      [(s["task"], int(s["seconds"]), s["start"], s["end"]) for s in sessions])
+
+    def append_session(self, rec):
+        with self._lock, self.conn as c:
+            self._insert_sessions(c, [rec])
+            c.execute("INSERT INTO tasks(name, total, target, pos) "
+                      "VALUES (?, ?, NULL, (SELECT COALESCE(MAX(pos), -1) + 1 FROM tasks)) "
+                      "ON CONFLICT(name) DO UPDATE SET total = total + excluded.total",
+                      (rec["task"], int(rec["seconds"])))
+
+    def import_sessions(self, rows):
+        with self._lock, self.conn as c:
+            c.executemany("INSERT INTO sessions(task, seconds, start_ts, end_ts) VALUES (?,?,?,?)",
+                          [(t, n, st, st + n) for t, st, n in rows])
+            c.executemany("INSERT INTO tasks(name, total, target, pos) "
+                          "VALUES (?, ?, NULL, (SELECT COALESCE(MAX(pos), -1) + 1 FROM tasks)) "
+                          "ON CONFLICT(name) DO UPDATE SET total = total + excluded.total",
+                          [(t, n) for t, st, n in rows])
+
+    def summary(self, today, start_week, start_month):
+        d0, d1 = day_epoch(today), day_epoch(today + timedelta(days=1))
+        w0, m0 = day_epoch(start_week), day_epoch(start_month)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT COALESCE(SUM(CASE WHEN end_ts >= :d0 AND end_ts < :d1 THEN seconds END), 0),"
+                "       COALESCE(SUM(CASE WHEN end_ts >= :w0 THEN seconds END), 0),"
+                "       COALESCE(SUM(CASE WHEN end_ts >= :m0 THEN seconds END), 0),"
+                "       COUNT(CASE WHEN end_ts >= :d0 AND end_ts < :d1 THEN 1 END)"
+                " FROM sessions WHERE end_ts >= MIN(:w0, :m0)",
+                {"d0": d0, "d1": d1, "w0": w0, "m0": m0}).fetchone()
+        return tuple(int(x) for x in row)
+
+    def task_totals(self, since=None, until=None):
+        sql, args = "SELECT task, SUM(seconds) FROM sessions WHERE end_ts >= ?", [day_epoch(since) if since else 0]
+        if until: sql += " AND end_ts < ?"; args.append(day_epoch(until))
+        with self._lock:
+            return {t: int(n) for t, n in self.conn.execute(sql + " GROUP BY task", args)}
+
+_DB = None
+
+def using_sqlite():
+    return _DB is not None
+
+def _load_db_data(readonly=False):
+    global _DB
+    if readonly:
+        db = SqliteStore(readonly=True)
+        try: data = db.load()
+        finally: db.close()
+    else:
+        if _DB is None: _DB = SqliteStore()
+        data = _DB.load()
+    for k,v in DEFAULT_DATA.items():
+        if k not in data: data[k] = copy.deepcopy(v)
+    rebuild_rollups(data)   # sqlite 后端的统计直接走索引，按天汇总只在内存里维护
+    return data
+
+def migrate_to_sqlite(data):
+    """把当前（JSON 分片）数据整体写入 data.db 并切换到 sqlite 后端；分片文件保留作备份。"""
+    global _DB
+    if sqlite3 is None: raise RuntimeError("当前 Python 不带 sqlite3 模块")
+    flush_data(); _write_shards(data, SHARD_FILES)     # 先让分片与日志对齐
+    tmp = f"{DB_FILE}.tmp"
+    if os.path.exists(tmp): os.remove(tmp)
+    store = SqliteStore(tmp)
+    store.save(data); store.save(data, ("sessions",)); store.close()
+    os.replace(tmp, DB_FILE)
+    _DB = SqliteStore()
+
+def leave_sqlite():
+    """停用 sqlite 后端：把数据库内容写回 JSON 分片，data.db 改名备份。"""
+    global _DB
+    flush_data()        # 先把排队中的设置写进数据库
+    data = _DB.load() if _DB is not None else _load_db_data()
+    data["journal_seq"] = 0
+    with _JOURNAL_LOCK:
+        _truncate(SESSIONS_JOURNAL); _truncate(WAL_FILE)     # 旧日志的 seq 与新分片无关
+        _DISK.update(shard_seq={}, wal_seq={}, session_seq=0, session_lines=0)
+    _write_shards(data, SHARD_FILES)
+    if _DB is not None: _DB.close(); _DB = None
+    os.replace(DB_FILE, f"{DB_FILE}.bak-{int(time.time())}")
+    return data
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""时钟层（engine.Clock）与 FocusEngine 在模拟时钟上的行为：休眠计入/不计入、运行中切换策略、
+墙钟跳变上报、休眠醒来后倒计时到点结束。"""
+import os, sys, tempfile, unittest
+
+os.environ["HOME"] = os.environ["USERPROFILE"] = tempfile.mkdtemp(prefix="focustimer-test-")   # 不碰 ~/.focustimer
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine import Clock, FocusEngine
+
+
+class SimTime:
+    """三个可控时间源：awake 不含休眠，boot 含休眠，wall 为墙钟（可被校时拨动）。"""
+    def __init__(self):
+        self.a = self.b = 1000.0; self.w = 1_700_000_000.0
+
+    def run(self, sec):
+        self.a += sec; self.b += sec; self.w += sec
+
+    def suspend(self, sec):
+        self.b += sec; self.w += sec
+
+    def clock(self, policy="count"):
+        return Clock(policy, awake=lambda: self.a, boot=lambda: self.b, wall=lambda: self.w)
+
+
+class MemoryStorage:
+    def __init__(self):
+        self.records = []
+
+    def append_session(self, data, rec):
+        self.records.append(rec)
+
+
+class ClockTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimTime(); self.jumps = []
+
+    def make(self, policy):
+        c = self.sim.clock(policy); c.on_jump = lambda kind, sec: self.jumps.append((kind, round(sec)))
+        return c
+
+    def test_suspend_counted(self):
+        c = self.make("count"); t0 = c()
+        self.sim.run(10); self.sim.suspend(600); self.sim.run(5)
+        self.assertAlmostEqual(c() - t0, 615)
+        self.assertEqual(self.jumps, [("suspend", 600)])
+        self.assertAlmostEqual(c.suspended, 600)
+
+    def test_suspend_discarded(self):
+        c = self.make("discard"); t0 = c()
+        self.sim.run(10); self.sim.suspend(600); self.sim.run(5)
+        self.assertAlmostEqual(c() - t0, 15)
+        self.assertEqual(self.jumps, [("suspend", 600)])
+
+    def test_small_gap_not_reported(self):
+        c = self.make("count"); c()
+        self.sim.run(1); self.sim.b += 0.5; self.sim.w += 0.5
+        c()
+        self.assertEqual(self.jumps, [])
+
+    def test_switch_policy_keeps_reading_continuous(self):
+        c = self.make("count"); self.sim.run(30); before = c()
+        c.policy = "discard"
+        self.assertAlmostEqual(c(), before)
+        self.sim.suspend(100); self.sim.run(2)
+        self.assertAlmostEqual(c(), before + 2)
+        c.policy = "count"; self.sim.suspend(50); self.sim.run(3)
+        self.assertAlmostEqual(c(), before + 2 + 53)
+
+    def test_reading_is_monotonic_across_wall_jump(self):
+        c = self.make("count"); t0 = c()
+        self.sim.w -= 3600; self.sim.run(4)
+        self.assertAlmostEqual(c() - t0, 4)
+        self.assertEqual(self.jumps, [("wall", -3600)])
+
+    def test_wall_jump_forward_reported(self):
+        c = self.make("discard"); c()
+        self.sim.w += 7200; self.sim.run(1); c()
+        self.assertEqual(self.jumps, [("wall", 7200)])
+
+    def test_unknown_policy_rejected(self):
+        with self.assertRaises(ValueError): self.make("pause")
+        c = self.make("count")
+        with self.assertRaises(ValueError): c.policy = "Count"
+        self.assertEqual(c.policy, "count")
+
+
+class EngineOnSimulatedClockTest(unittest.TestCase):
+    def setUp(self):
+        self.sim = SimTime(); self.store = MemoryStorage()
+
+    def engine(self, policy):
+        return FocusEngine({"tasks": {"数学": {"total": 0, "target": None}}}, storage=self.store,
+                           clock=self.sim.clock(policy), wall=lambda: self.sim.w)
+
+    def wake(self, eng):
+        """像界面一样在截止时刻醒来一次（休眠期间醒不来，由调用方先推进时间）。"""
+        d = eng.next_deadline()
+        now = eng.clock()
+        if d is not None and d > now: self.sim.run(d - now + 0.001)
+        return eng.tick()
+
+    def test_countdown_finishes_after_resume_when_counted(self):
+        eng = self.engine("count"); t = eng.start("countdown", 1500, task="数学", main=True)
+        self.sim.run(300); self.sim.suspend(3600)
+        events = eng.tick()
+        self.assertIn("finish", [kind for kind, _, _ in events])
+        self.assertIsNone(eng.main)
+        self.assertEqual(self.store.records[-1]["seconds"], 1500)
+        self.assertEqual(self.store.records[-1]["end"], int(self.sim.w))
+        self.assertTrue(t.done())
+
+    def test_countdown_resumes_where_it_left_off_when_discarded(self):
+        eng = self.engine("discard"); t = eng.start("countdown", 1500, task="数学", main=True)
+        self.sim.run(300); self.sim.suspend(3600)
+        self.assertNotIn("finish", [kind for kind, _, _ in eng.tick()])
+        self.assertEqual(t.shown(), 1200)
+        while eng.main is not None:
+            self.wake(eng)
+        self.assertEqual(self.store.records[-1]["seconds"], 1500)
+
+    def test_countup_unaffected_by_wall_jump(self):
+        eng = self.engine("count"); t = eng.start("countup", task="数学", main=True)
+        self.sim.run(100); self.sim.w -= 86400; self.sim.run(20)
+        self.assertEqual(t.shown(), 120)
+        self.assertEqual(eng.finish(), 120)
+        rec = self.store.records[-1]
+        self.assertEqual(rec["end"] - rec["start"], 120)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""分片存储的崩溃恢复：追加会话/带键保存后进程被杀再启动、单个分片缺失或损坏、旧版 data.json 迁移、
+会话日志合并后不重复累加。每一步都在独立的子进程里跑（各自的临时 HOME），"被杀"就是 os._exit。"""
+import os, sys, json, glob, shutil, tempfile, textwrap, unittest, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRELUDE = """
+import os, sys, json, time
+sys.path.insert(0, {root!r})
+import storage
+from storage import load_data, save_data, flush_data, append_session, session_record
+def report(d):
+    print(json.dumps({{"n": len(d["sessions"]), "tasks": {{k: v["total"] for k, v in d["tasks"].items()}},
+                      "rollup": sum(r["seconds"] for r in d["rollups"].values()),
+                      "beep": d["beep"], "events": d["future_events"],
+                      "notes": d["minimal_notes_memory"]}}, ensure_ascii=False))
+"""
+T0 = 1_760_000_000
+
+
+class StorageRecoveryTest(unittest.TestCase):
+    def setUp(self):
+        self.home = tempfile.mkdtemp(prefix="focustimer-test-")
+        self.dir = os.path.join(self.home, ".focustimer")
+
+    def tearDown(self):
+        shutil.rmtree(self.home, ignore_errors=True)
+
+    def run_py(self, code):
+        """在全新的进程里运行 code；返回它最后一行输出解析成的 JSON（没有输出则为 None）。"""
+        env = dict(os.environ, HOME=self.home, USERPROFILE=self.home)
+        src = PRELUDE.format(root=ROOT) + textwrap.dedent(code)
+        p = subprocess.run([sys.executable, "-c", src], env=env, capture_output=True, text=True, timeout=60)
+        self.assertEqual(p.returncode, 0, p.stderr)
+        lines = p.stdout.strip().splitlines()
+        return json.loads(lines[-1]) if lines else None
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def seed(self, n=3, seconds=600):
+        """新装后记 n 条会话并把全部分片写出。"""
+        self.run_py(f"""
+            d = load_data()
+            for i in range({n}): append_session(d, session_record("数学", {T0} + i * 3600, {seconds}))
+            d["future_events"] = [{{"name": "考试", "ts": {T0} + 86400}}]
+            d["minimal_notes_memory"] = "草稿"
+            save_data(d); flush_data()
+        """)
+
+    def test_session_and_keyed_save_survive_kill(self):
+        self.run_py(f"""
+            storage.SAVE_QUIET_SEC = 60     # 分片来不及重写：只剩会话日志和 WAL
+            d = load_data()
+            append_session(d, session_record("数学", {T0}, 1500))
+            d["beep"] = False; save_data(d, "beep")
+            time.sleep(storage.WAL_FLUSH_SEC * 3)
+            os._exit(0)
+        """)
+        r = self.run_py("report(load_data())")
+        self.assertEqual(r["n"], 1)
+        self.assertEqual(r["tasks"]["数学"], 1500)
+        self.assertEqual(r["rollup"], 1500)
+        self.assertFalse(r["beep"])
+        self.assertEqual(self.run_py("report(load_data())"), r)
+
+    def test_corrupt_settings_keeps_other_shards_and_rebuilds_totals(self):
+        self.seed(3, 600)
+        with open(self.path("settings.json"), "w", encoding="utf-8") as f: f.write('{"seq": 4, "data": {"tas')
+        r = self.run_py("report(load_data())")
+        self.assertEqual(r["n"], 3)
+        self.assertEqual(r["tasks"]["数学"], 1800)
+        self.assertEqual(r["rollup"], 1800)
+        self.assertEqual(r["events"][0]["name"], "考试")
+        self.assertEqual(r["notes"], "草稿")
+        self.assertEqual(len(glob.glob(self.path("settings.json.broken-*"))), 1)
+        self.assertEqual(self.run_py("report(load_data())"), r)
+
+    def test_missing_shard_keeps_the_others(self):
+        self.seed(2, 900)
+        os.remove(self.path("events.json"))
+        r = self.run_py("report(load_data())")
+        self.assertEqual(r["events"], [])
+        self.assertEqual((r["n"], r["tasks"]["数学"], r["notes"]), (2, 1800, "草稿"))
+        self.assertTrue(os.path.exists(self.path("events.json")))
+
+    def test_readonly_load_leaves_files_alone(self):
+        self.seed(1)
+        with open(self.path("notes.json"), "w", encoding="utf-8") as f: f.write("not json")
+        before = sorted(os.listdir(self.dir))
+        r = self.run_py("report(load_data(readonly=True))")
+        self.assertEqual(r["n"], 1)
+        self.assertEqual(sorted(os.listdir(self.dir)), before)
+
+    def test_legacy_data_json_migrates(self):
+        os.makedirs(self.dir, exist_ok=True)
+        legacy = {"beep": False, "tasks": {"英语": 120, "数学": {"total": 600, "target": 1500}},
+                  "sessions": [{"task": "数学", "seconds": 600,
+                                "start_iso": "2025-10-01T08:00:00", "end_iso": "2025-10-01T08:10:00"}],
+                  "future_events": [{"name": "考试", "ts": T0}], "journal_seq": 0}
+        with open(self.path("data.json"), "w", encoding="utf-8") as f: json.dump(legacy, f, ensure_ascii=False)
+        r = self.run_py("d = load_data(); report(d); flush_data()")
+        self.assertEqual(r["tasks"], {"英语": 120, "数学": 600})
+        self.assertEqual((r["n"], r["rollup"], r["beep"]), (1, 600, False))
+        self.assertFalse(os.path.exists(self.path("data.json")))
+        self.assertTrue(os.path.exists(self.path("data.json.migrated")))
+        for p in ("settings", "caches", "sessions", "events", "notes"):
+            self.assertTrue(os.path.exists(self.path(f"{p}.json")), p)
+        with open(self.path("sessions.json"), encoding="utf-8") as f:
+            self.assertIn("start", json.load(f)["data"]["sessions"][0])    # 后台已改写成 epoch 记录
+        self.assertEqual(self.run_py("report(load_data())"), r)
+
+    def test_compaction_does_not_double_count(self):
+        self.run_py(f"""
+            storage.JOURNAL_COMPACT_LINES = 5
+            d = load_data()
+            for i in range(7): append_session(d, session_record("数学", {T0} + i * 3600, 300))
+            flush_data()                    # 合并进分片，日志清空
+            for i in range(7, 9): append_session(d, session_record("数学", {T0} + i * 3600, 300))
+            os._exit(0)                     # 合并之后的两条只在日志里
+        """)
+        with open(self.path("sessions.jsonl"), encoding="utf-8") as f:
+            self.assertEqual(len(f.readlines()), 2)
+        r = self.run_py("report(load_data())")
+        self.assertEqual((r["n"], r["tasks"]["数学"], r["rollup"]), (9, 2700, 2700))
+        self.assertEqual(self.run_py("d = load_data(); flush_data(); report(d)"), r)
+        self.assertEqual(self.run_py("report(load_data())"), r)
+
+
+if __name__ == "__main__":
+    unittest.main()